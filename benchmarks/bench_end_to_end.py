@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Time relbot commands end to end against the local GitHub and Maven
+# stand-ins of testing/standins.py, with latency added to every request.
+# Reports the wall time, the requests made per endpoint and the bytes received.
+#
+#   python benchmarks/bench_end_to_end.py [--latency MS] [--repeat N] [--no-op]
+#
+
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+for path in ("src", "testing"):
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", path))
+
+import android_components  # noqa: E402
+import standins  # noqa: E402
+import util  # noqa: E402
+
+COMMANDS = {
+    "update_main": lambda env: android_components.update_main(
+        env.firefox_repo, env.author, dry_run=False
+    ),
+    "update_releases": lambda env: android_components.update_releases(
+        env.firefox_repo, env.author, dry_run=False
+    ),
+    "update_android_components_nightly": lambda env: (
+        util.update_android_components_nightly(
+            env.firefox_repo, env.rb_repo, "", env.author, False, "master", False
+        )
+    ),
+}
+
+
+def bench(command, latency, repeat, outdated):
+    """Return the wall times of repeat runs of command, and the requests and
+    bytes of the last one. Every run starts from a fresh scenario."""
+    times = []
+    for _ in range(repeat):
+        with standins.running(latency=latency, outdated=outdated) as env:
+            start = time.perf_counter()
+            COMMANDS[command](env)
+            times.append(time.perf_counter() - start)
+            calls = {
+                "github": env.github.calls.copy(),
+                "maven": env.maven.calls.copy(),
+            }
+            size = env.github.bytes + env.maven.bytes
+    return times, calls, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=50, help="ms per request")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-op", action="store_true", help="start with every branch up to date"
+    )
+    parser.add_argument("commands", nargs="*", default=list(COMMANDS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{args.latency:g} ms latency per request, {args.repeat} run(s) each\n")
+    for command in args.commands:
+        times, calls, size = bench(
+            command, args.latency / 1000, args.repeat, not args.no_op
+        )
+        total = sum(sum(counter.values()) for counter in calls.values())
+        print(
+            f"{command}: {statistics.median(times) * 1000:.0f} ms median "
+            f"(min {min(times) * 1000:.0f} ms), {total} requests, {size} bytes"
+        )
+        for service, counter in calls.items():
+            for endpoint, count in sorted(counter.items()):
+                print(f"  {service:7} {endpoint:28} {count:4}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
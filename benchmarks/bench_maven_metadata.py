@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Compare the streaming maven-metadata.xml reader in util with xmltodict on
+# large synthetic documents, for CPU time and peak memory.
+#
+#   python benchmarks/bench_maven_metadata.py [number-of-versions ...]
+#
+
+
+import os
+import sys
+import time
+import tracemalloc
+
+import xmltodict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from util import get_metadata_latest, iter_metadata_versions  # noqa: E402
+
+REPEAT = 5
+
+
+def synthetic_metadata(count):
+    """Return a maven-metadata.xml listing count nightly-style versions,
+    spread over majors 100 and up."""
+    versions = [f"{100 + i // 1000}.0.{20230101000000 + i}" for i in range(count)]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<metadata>\n'
+        "  <groupId>org.mozilla.components</groupId>\n"
+        "  <artifactId>ui-widgets</artifactId>\n"
+        f"  <versioning>\n    <latest>{versions[-1]}</latest>\n"
+        f"    <release>{versions[-1]}</release>\n    <versions>\n"
+        + "".join(f"      <version>{v}</version>\n" for v in versions)
+        + "    </versions>\n  </versioning>\n</metadata>\n"
+    ).encode("utf8")
+
+
+def measure(fn):
+    """Return (best wall time, peak traced memory) of fn."""
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def xmltodict_latest(src):
+    return xmltodict.parse(src)["metadata"]["versioning"]["latest"]
+
+
+def xmltodict_major(src, major):
+    versions = xmltodict.parse(src)["metadata"]["versioning"]["versions"]["version"]
+    return [v for v in versions if v.startswith(f"{major}.")]
+
+
+def main(argv):
+    counts = [int(a) for a in argv[1:]] or [1000, 10000, 50000]
+    print(f"{'versions':>9} {'case':<16} {'parser':<10} {'time ms':>9} {'peak KiB':>9}")
+    for count in counts:
+        src = synthetic_metadata(count)
+        major = 100 + count // 2000
+        cases = [
+            ("latest", "xmltodict", lambda: xmltodict_latest(src)),
+            ("latest", "streaming", lambda: get_metadata_latest(src)),
+            ("major", "xmltodict", lambda: xmltodict_major(src, major)),
+            ("major", "streaming", lambda: list(iter_metadata_versions(src, major))),
+        ]
+        assert xmltodict_latest(src) == get_metadata_latest(src)
+        assert xmltodict_major(src, major) == list(iter_metadata_versions(src, major))
+        for case, parser, fn in cases:
+            elapsed, peak = measure(fn)
+            print(
+                f"{count:>9} {case:<16} {parser:<10} "
+                f"{elapsed * 1000:>9.2f} {peak / 1024:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
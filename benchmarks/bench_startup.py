@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Measure how long relbot takes to start: the wall time of an invocation with
+# invalid arguments, and the cumulative import time of relbot and of the
+# modules each command needs, as reported by python -X importtime.
+#
+#   python benchmarks/bench_startup.py
+#
+
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+REPEAT = 5
+
+# What each command imports on top of relbot itself
+MODULES = {
+    "relbot": "relbot",
+    "android-components": "android_components",
+    "reference-browser": "reference_browser",
+    "serve": "daemon",
+}
+
+
+def run(args):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args], cwd=SRC, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, result
+
+
+def import_time(module):
+    """Return the cumulative import time of module in ms, the median of
+    REPEAT fresh interpreters."""
+    times = []
+    for _ in range(REPEAT):
+        _, result = run(["-X", "importtime", "-c", f"import {module}"])
+        for line in result.stderr.splitlines():
+            _, cumulative, name = line.split("|")
+            if name.strip() == module:
+                times.append(int(cumulative) / 1000)
+    return statistics.median(times)
+
+
+def main():
+    wall = statistics.median(run(["relbot.py"])[0] for _ in range(REPEAT))
+    print(f"{'relbot.py without arguments':32} {wall * 1000:8.1f} ms wall")
+    wall = statistics.median(run(["-c", "pass"])[0] for _ in range(REPEAT))
+    print(f"{'python -c pass':32} {wall * 1000:8.1f} ms wall")
+    for command, module in MODULES.items():
+        print(f"{'import ' + module:32} {import_time(module):8.1f} ms ({command})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,25 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/
 
 
+import functools
 import logging
 import re
 
-from github import GithubException
 from mozilla_version.mobile import MobileVersion
 
+import fingerprints
+import github_graphql
+from changeset import ChangeSet
+from ratelimit import (
+    PRIORITY_MAIN,
+    PRIORITY_RELEASE,
+    ScheduledTask,
+    schedule,
+    task_cost,
+)
+from snapshot import get_head_sha
+from tasks import raise_for_failures, run_tasks
+from tracing import traced
 from util import (
     compare_as_versions,
     compare_gv_versions,
@@ -20,13 +33,17 @@ from util import (
     get_current_gv_channel,
     get_current_gv_version,
     get_dependencies_file_path,
+    get_dependency_file_paths,
     get_gecko_file_path,
+    get_gv_catalog,
     get_latest_as_version,
     get_latest_glean_version,
     get_latest_gv_version,
     get_recent_fenix_versions,
     major_as_version_from_version,
     major_gv_version_from_version,
+    major_version_from_fenix_release_branch_name,
+    pr_branch_exists,
     use_legacy_as_handling,
 )
 
@@ -37,10 +54,9 @@ log = logging.getLogger(__name__)
 #
 
 
-def _update_ac_buildconfig(ac_repo, old_ac_version, new_ac_version, branch, author):
-    contents = ac_repo.get_contents("android-components/.buildconfig.yml", ref=branch)
-
-    content = contents.decoded_content.decode("utf-8")
+def _update_ac_buildconfig(changes, old_ac_version, new_ac_version):
+    path = "android-components/.buildconfig.yml"
+    content = changes.read(path)
     new_content = re.sub(
         r"componentsVersion: \d+\.\d+\.\d+",
         f"componentsVersion: {new_ac_version}",
@@ -52,20 +68,12 @@ def _update_ac_buildconfig(ac_repo, old_ac_version, new_ac_version, branch, auth
             "maybe the file was already up to date?"
         )
 
-    ac_repo.update_file(
-        contents.path,
-        f"Set version to {new_ac_version}.",
-        new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
-    )
-
+    changes.write(path, new_content, f"Set version to {new_ac_version}.")
 
-def _update_ac_version(ac_repo, old_ac_version, new_ac_version, branch, author):
-    contents = ac_repo.get_contents("version.txt", ref=branch)
 
-    content = contents.decoded_content.decode("utf-8")
+def _update_ac_version(changes, old_ac_version, new_ac_version):
+    path = "version.txt"
+    content = changes.read(path)
     new_content = content.replace(old_ac_version, new_ac_version)
     if content == new_content:
         raise Exception(
@@ -73,21 +81,14 @@ def _update_ac_version(ac_repo, old_ac_version, new_ac_version, branch, author):
             "maybe the file was already up to date?"
         )
 
-    ac_repo.update_file(
-        contents.path,
-        f"Set version.txt to {new_ac_version}.",
-        new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
-    )
+    changes.write(path, new_content, f"Set version.txt to {new_ac_version}.")
 
 
 def _update_gv_version(
-    ac_repo, old_gv_version, new_gv_version, branch, channel, author, ac_major_version
+    changes, old_gv_version, new_gv_version, channel, ac_major_version
 ):
-    contents = ac_repo.get_contents(get_gecko_file_path(ac_major_version), ref=branch)
-    content = contents.decoded_content.decode("utf-8")
+    path = get_gecko_file_path(ac_major_version)
+    content = changes.read(path)
     new_content = content.replace(
         f'const val version = "{old_gv_version}"',
         f'const val version = "{new_gv_version}"',
@@ -103,19 +104,14 @@ def _update_gv_version(
             "maybe the file was already up to date?"
         )
 
-    ac_repo.update_file(
-        contents.path,
-        f"Update GeckoView ({channel.capitalize()}) to {new_gv_version}.",
+    changes.write(
+        path,
         new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
+        f"Update GeckoView ({channel.capitalize()}) to {new_gv_version}.",
     )
 
 
-def _update_as_version(
-    ac_repo, old_as_version, new_as_version, branch, author, ac_major_version
-):
+def _update_as_version(changes, old_as_version, new_as_version, ac_major_version):
     if use_legacy_as_handling(ac_major_version):
         path = get_dependencies_file_path(ac_major_version)
         current_version_string = f'mozilla_appservices = "{old_as_version}"'
@@ -126,8 +122,7 @@ def _update_as_version(
         new_version_string = f'val VERSION = "{new_as_version}"'
     log.info(f"Updating app-services version in {path}")
 
-    contents = ac_repo.get_contents(path, ref=branch)
-    content = contents.decoded_content.decode("utf-8")
+    content = changes.read(path)
     new_content = content.replace(current_version_string, new_version_string)
     if content == new_content:
         raise Exception(
@@ -135,23 +130,14 @@ def _update_as_version(
             "maybe the file was already up to date?"
         )
 
-    ac_repo.update_file(
-        contents.path,
-        f"Update A-S to {new_as_version}.",
-        new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
-    )
+    changes.write(path, new_content, f"Update A-S to {new_as_version}.")
 
 
 def _update_glean_version(
-    ac_repo, old_glean_version, new_glean_version, branch, author, ac_major_version
+    changes, old_glean_version, new_glean_version, ac_major_version
 ):
-    contents = ac_repo.get_contents(
-        get_dependencies_file_path(ac_major_version), ref=branch
-    )
-    content = contents.decoded_content.decode("utf-8")
+    path = get_dependencies_file_path(ac_major_version)
+    content = changes.read(path)
     new_content = content.replace(
         f'mozilla_glean = "{old_glean_version}"',
         f'mozilla_glean = "{new_glean_version}"',
@@ -162,22 +148,46 @@ def _update_glean_version(
             "maybe the file was already up to date?"
         )
 
-    ac_repo.update_file(
-        contents.path,
-        f"Update Glean to {new_glean_version}.",
-        new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
+    changes.write(path, new_content, f"Update Glean to {new_glean_version}.")
+
+
+def _gv_upstream(channel):
+    return get_gv_catalog(channel).validator
+
+
+def _geckoview_unchanged(ac_repo, release_branch_name):
+    """Return True if the last GeckoView update on release_branch_name found
+    nothing to do, and neither the branch nor the GV metadata changed since.
+    Only the branch head is needed, none of its files."""
+    store = fingerprints.get_store()
+    if store is None or not store.unchanged(
+        ac_repo,
+        release_branch_name,
+        "update-geckoview",
+        get_head_sha(ac_repo, release_branch_name),
+        _gv_upstream,
+    ):
+        return False
+    log.info(
+        f"Neither {release_branch_name} nor the GV metadata changed since the "
+        "last GeckoView update found nothing to do. Skipping."
     )
+    return True
 
 
+@traced
 def _update_geckoview(
     ac_repo, release_branch_name, ac_major_version, author, dry_run=False
 ):
     try:
         log.info(f"Updating GeckoView on A-C {ac_repo.full_name}:{release_branch_name}")
 
+        # Callers skip the branch with _geckoview_unchanged() when the last
+        # no-op still holds. Record the head this check is based on.
+        store = fingerprints.get_store()
+        if store is not None:
+            head_sha = get_head_sha(ac_repo, release_branch_name)
+
         gv_channel = get_current_gv_channel(
             ac_repo, release_branch_name, ac_major_version
         )
@@ -216,6 +226,15 @@ def _update_geckoview(
             log.warning(
                 f"No newer GV {gv_channel.capitalize()} release found. Exiting."
             )
+            if store is not None:
+                store.record(
+                    ac_repo,
+                    release_branch_name,
+                    "update-geckoview",
+                    head_sha,
+                    gv_channel,
+                    _gv_upstream(gv_channel),
+                )
             return
 
         log.info(
@@ -238,37 +257,25 @@ def _update_geckoview(
         # Create a non unique PR branch name for work on this ac release branch.
         pr_branch_name = f"relbot/upgrade-geckoview-ac-{short_version}"
 
-        try:
-            pr_branch = ac_repo.get_branch(pr_branch_name)
-            if pr_branch:
-                log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
-                return
-        except GithubException:
-            # TODO Only ignore a 404 here, fail on others
-            pass
+        if pr_branch_exists(ac_repo, pr_branch_name):
+            log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
+            return
 
         #
-        # Create a new branch for this update
+        # Create a new branch for this update, with all changes in one commit
         #
 
-        release_branch = ac_repo.get_branch(release_branch_name)
-        log.info(f"Last commit on {release_branch_name} is {release_branch.commit.sha}")
-
-        ac_repo.create_git_ref(
-            ref=f"refs/heads/{pr_branch_name}", sha=release_branch.commit.sha
-        )
-        log.info(f"Created branch {pr_branch_name} on {release_branch.commit.sha}")
+        changes = ChangeSet(ac_repo, release_branch_name)
+        log.info(f"Last commit on {release_branch_name} is {changes.base_sha}")
 
         log.info(
             "Updating android-components/plugins/dependencies/src/main/java/Gecko.kt"
         )
         _update_gv_version(
-            ac_repo,
+            changes,
             current_gv_version,
             latest_gv_version,
-            pr_branch_name,
             gv_channel,
-            author,
             ac_major_version,
         )
 
@@ -278,13 +285,14 @@ def _update_geckoview(
                 "main/java/DependenciesPlugin.kt"
             )
             _update_glean_version(
-                ac_repo,
+                changes,
                 current_glean_version,
                 latest_glean_version,
-                pr_branch_name,
-                author,
                 ac_major_version,
             )
+
+        changes.create_branch(pr_branch_name, author)
+
         #
         # Create the pull request
         #
@@ -304,6 +312,7 @@ def _update_geckoview(
         raise e
 
 
+@traced
 def _update_application_services(
     ac_repo, release_branch_name, ac_major_version, author, dry_run=False
 ):
@@ -356,36 +365,26 @@ def _update_application_services(
         # Create a non unique PR branch name for work on this ac release branch.
         pr_branch_name = f"relbot/update-as/ac-{short_version}"
 
-        try:
-            pr_branch = ac_repo.get_branch(pr_branch_name)
-            if pr_branch:
-                log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
-                return
-        except GithubException:
-            # TODO Only ignore a 404 here, fail on others
-            pass
+        if pr_branch_exists(ac_repo, pr_branch_name):
+            log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
+            return
 
         #
         # Create a new branch for this update
         #
 
-        release_branch = ac_repo.get_branch(release_branch_name)
-        log.info(f"Last commit on {release_branch_name} is {release_branch.commit.sha}")
-
-        ac_repo.create_git_ref(
-            ref=f"refs/heads/{pr_branch_name}", sha=release_branch.commit.sha
-        )
-        log.info(f"Created branch {pr_branch_name} on {release_branch.commit.sha}")
+        changes = ChangeSet(ac_repo, release_branch_name)
+        log.info(f"Last commit on {release_branch_name} is {changes.base_sha}")
 
         _update_as_version(
-            ac_repo,
+            changes,
             current_as_version,
             latest_as_version,
-            pr_branch_name,
-            author,
             ac_major_version,
         )
 
+        changes.create_branch(pr_branch_name, author)
+
         #
         # Create the pull request
         #
@@ -422,14 +421,49 @@ def _update_application_services(
 #
 
 
-def update_main(ac_repo, author, dry_run):
+@traced
+def update_main(ac_repo, author, dry_run, max_workers=None):
     branch_name = "main"
+    github_graphql.prefetch_branches(
+        ac_repo, [branch_name], get_dependency_file_paths(None)
+    )
     current_ac_version = get_current_ac_version(ac_repo, branch_name)
     ac_major_version = MobileVersion.parse(current_ac_version).major_number
-    _update_application_services(
-        ac_repo, branch_name, ac_major_version, author, dry_run
-    )
-    _update_geckoview(ac_repo, branch_name, ac_major_version, author, dry_run)
+    # A-S and GV touch different files and open different PR branches, so
+    # they can run side by side. Both share the snapshot of main read above.
+    tasks = [
+        ScheduledTask(
+            f"{branch_name}/update-as",
+            functools.partial(
+                _update_application_services,
+                ac_repo,
+                branch_name,
+                ac_major_version,
+                author,
+                dry_run,
+            ),
+            PRIORITY_MAIN,
+            task_cost("update-as"),
+        )
+    ]
+    if not _geckoview_unchanged(ac_repo, branch_name):
+        tasks.append(
+            ScheduledTask(
+                f"{branch_name}/update-geckoview",
+                functools.partial(
+                    _update_geckoview,
+                    ac_repo,
+                    branch_name,
+                    ac_major_version,
+                    author,
+                    dry_run,
+                ),
+                PRIORITY_MAIN,
+                task_cost("update-geckoview"),
+            )
+        )
+    results = run_tasks(schedule(tasks), max_workers=max_workers)
+    raise_for_failures(results)
 
 
 #
@@ -437,9 +471,76 @@ def update_main(ac_repo, author, dry_run):
 #
 
 
-def update_releases(firefox_repo, author, dry_run):
-    for ac_version in get_recent_fenix_versions(firefox_repo):
-        release_branch_name = f"releases_v{ac_version}"
-        _update_geckoview(
-            firefox_repo, release_branch_name, ac_version, author, dry_run
-        )
+@traced
+def update_releases(firefox_repo, author, dry_run, max_workers=None):
+    # Listing the release branches records their heads, which is all it
+    # takes to skip the branches where nothing changed since the last no-op
+    ac_versions = [
+        ac_version
+        for ac_version in get_recent_fenix_versions(firefox_repo)
+        if not _geckoview_unchanged(firefox_repo, f"releases_v{ac_version}")
+    ]
+    if not ac_versions:
+        return
+    github_graphql.prefetch_branches(
+        firefox_repo,
+        [f"releases_v{ac_version}" for ac_version in ac_versions],
+        get_dependency_file_paths(None),
+    )
+    # Branches are independent, so work on them in parallel. A failure on one
+    # branch does not stop the others, but fails the run at the end. The
+    # newest branches go first, so they are the last to be deferred when the
+    # rate limit runs low.
+    results = run_tasks(
+        schedule(
+            [
+                ScheduledTask(
+                    f"releases_v{ac_version}",
+                    functools.partial(
+                        _update_geckoview,
+                        firefox_repo,
+                        f"releases_v{ac_version}",
+                        ac_version,
+                        author,
+                        dry_run,
+                    ),
+                    PRIORITY_RELEASE + rank,
+                    task_cost("update-geckoview"),
+                )
+                for rank, ac_version in enumerate(sorted(ac_versions, reverse=True))
+            ]
+        ),
+        max_workers=max_workers,
+    )
+    raise_for_failures(results)
+
+
+#
+# Run a single task on a single branch, when an upstream change is known to
+# only affect that branch.
+#
+
+BRANCH_TASKS = {
+    "update-geckoview": _update_geckoview,
+    "update-as": _update_application_services,
+}
+
+
+@traced
+def update_branch(ac_repo, branch_name, task, author, dry_run):
+    """Run task, one of BRANCH_TASKS, on main or on a release branch. Release
+    branches that update_releases would not look at are left alone."""
+    if branch_name != "main":
+        ac_major_version = major_version_from_fenix_release_branch_name(branch_name)
+        if ac_major_version not in get_recent_fenix_versions(ac_repo):
+            log.info(f"{branch_name} is not a recent release branch. Skipping.")
+            return
+    if task == "update-geckoview" and _geckoview_unchanged(ac_repo, branch_name):
+        return
+    github_graphql.prefetch_branches(
+        ac_repo, [branch_name], get_dependency_file_paths(None)
+    )
+    if branch_name == "main":
+        current_ac_version = get_current_ac_version(ac_repo, branch_name)
+        ac_major_version = MobileVersion.parse(current_ac_version).major_number
+    BRANCH_TASKS[task](ac_repo, branch_name, ac_major_version, author, dry_run)
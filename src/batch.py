@@ -0,0 +1,74 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# relbot batch: run several commands in one process.
+#
+# Commands are given as arguments, one quoted command each, or in a file
+# with --file, one command per line:
+#
+#   relbot batch "android-components update-main" \
+#       "reference-browser update-android-components"
+#   relbot batch --file commands.txt
+#
+# They run one after the other and share the GitHub client, the connection
+# pools and what was read from GitHub and Maven. A failing command does not
+# stop the others; the batch fails if any of them did.
+#
+
+
+import logging
+import shlex
+import time
+from collections import namedtuple
+
+from tasks import task_context
+
+log = logging.getLogger(__name__)
+
+BatchResult = namedtuple("BatchResult", ["command", "status", "elapsed"])
+
+
+def parse_commands(args):
+    """Return the commands of a batch command line, as lists of arguments."""
+    if args[:1] == ["--file"]:
+        if len(args) != 2:
+            raise ValueError("usage: relbot batch --file <file>")
+        with open(args[1]) as f:
+            lines = [line.split("#", 1)[0] for line in f]
+    else:
+        lines = args
+    commands = [shlex.split(line) for line in lines]
+    return [command for command in commands if command]
+
+
+def run_batch(commands, run):
+    """Run every command with run(command) and return a BatchResult each.
+    The status is the exit status the command would have had on its own."""
+    results = []
+    for command in commands:
+        name = " ".join(command)
+        start = time.monotonic()
+        with task_context(name):
+            try:
+                run(command)
+                status = 0
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else int(bool(e.code))
+            except Exception:
+                log.exception(f"{name} failed")
+                status = 1
+        results.append(BatchResult(name, status, time.monotonic() - start))
+    return results
+
+
+def exit_status(results):
+    """Log the outcome of every command and return the exit status of the
+    batch: 0 if all commands succeeded, 1 otherwise."""
+    for result in results:
+        outcome = "succeeded" if result.status == 0 else f"failed ({result.status})"
+        log.info(f"{result.command}: {outcome} in {result.elapsed:.1f}s")
+    failed = [result for result in results if result.status != 0]
+    log.info(f"Batch: {len(results) - len(failed)} of {len(results)} succeeded")
+    return 1 if failed else 0
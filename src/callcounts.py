@@ -0,0 +1,104 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Count the outbound requests of a command per endpoint, and hold them
+# against declared budgets.
+#
+# Requests are classified like "github GET contents", "github POST git/refs"
+# or "maven GET pom". The budgets below are the most requests each command
+# may make against the stand-ins of standins.py; test_callcounts.py fails
+# when a change makes a command more expensive. Lower them when a change
+# makes one cheaper.
+#
+
+
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import http_session
+
+# {name: {total: most requests}}, where a total is one of "github reads",
+# "github writes" or "maven reads" (Maven and the Taskcluster index)
+BUDGETS = {
+    # Every branch is up to date
+    "update-main no-op": {"github reads": 1, "github writes": 0, "maven reads": 8},
+    "update-releases no-op": {
+        "github reads": 3,
+        "github writes": 0,
+        "maven reads": 14,
+    },
+    "update-android-components-nightly no-op": {
+        "github reads": 2,
+        "github writes": 0,
+        "maven reads": 1,
+    },
+    # Every branch gets a PR
+    "update-main": {"github reads": 5, "github writes": 9, "maven reads": 8},
+    "update-releases": {"github reads": 6, "github writes": 8, "maven reads": 14},
+    "update-android-components-nightly": {
+        "github reads": 4,
+        "github writes": 4,
+        "maven reads": 1,
+    },
+}
+
+
+def endpoint_class(service, method, url):
+    """Return the endpoint class of a request, like "GET git/refs"."""
+    path = urlparse(url).path
+    if service != "github":
+        if service == "taskcluster":
+            return f"{method} taskcluster"
+        if path.endswith("/maven-metadata.xml"):
+            return f"{method} maven-metadata.xml"
+        return f"{method} {path.rsplit('.', 1)[-1]}"
+    if path.endswith("/graphql"):
+        return f"{method} graphql"
+    segments = re.sub(r"^(/api/v3)?/repos/[^/]+/[^/]+/?", "", path).split("/")
+    if segments[0] == "git" and len(segments) > 1:
+        return f"{method} git/{segments[1]}"
+    if segments[0] == "issues" and segments[-1] == "comments":
+        return f"{method} issues/comments"
+    return f"{method} {segments[0] or 'repos'}"
+
+
+class CallCounter:
+    """Counts the requests made through http_session, per service and
+    endpoint class."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.totals = Counter()
+
+    def observe(self, event):
+        endpoint = endpoint_class(event.service, event.method, event.url)
+        service = "github" if event.service == "github" else "maven"
+        kind = "writes" if http_session.is_write(event.method, event.url) else "reads"
+        with self._lock:
+            self.calls[f"{event.service} {endpoint}"] += 1
+            self.totals[f"{service} {kind}"] += 1
+
+    def over_budget(self, name):
+        """Return a description of every total over the budget called name."""
+        return [
+            f"{name}: {total} {self.totals[total]} > {limit} ({dict(self.calls)})"
+            for total, limit in BUDGETS[name].items()
+            if self.totals[total] > limit
+        ]
+
+
+@contextmanager
+def counting():
+    """Count the requests made in the block. Yields a CallCounter."""
+    counter = CallCounter()
+    http_session.add_observer(counter.observe)
+    try:
+        yield counter
+    finally:
+        http_session.remove_observer(counter.observe)
@@ -0,0 +1,74 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Collect file edits for a PR branch and write them as a single commit.
+#
+# Instead of creating the PR branch and then mutating it with one
+# contents-API commit per file, all edits are gathered in a ChangeSet and
+# written with the Git Data API: one tree (with the new file contents inline)
+# on top of the base commit, one commit, and the PR branch is created
+# directly at that commit. A failure before the final step leaves no branch
+# behind.
+#
+
+
+import logging
+
+from github import InputGitTreeElement
+
+import snapshot
+from tracing import traced
+
+log = logging.getLogger(__name__)
+
+
+class ChangeSet:
+    """Pending edits to files of repo, relative to the head of base_branch."""
+
+    def __init__(self, repo, base_branch):
+        self.repo = repo
+        self.base_branch = base_branch
+        self.base_sha = snapshot.get_head_sha(repo, base_branch)
+        self.files = {}
+        self.messages = []
+
+    def read(self, path):
+        """Return the contents of path, including any pending edit."""
+        if path in self.files:
+            return self.files[path]
+        return snapshot.get_decoded_contents(self.repo, path, self.base_sha)
+
+    def write(self, path, content, message):
+        """Record new contents for path, described by message."""
+        self.files[path] = content
+        self.messages.append(message)
+
+    def commit_message(self):
+        return " ".join(self.messages)
+
+    @traced
+    def create_branch(self, branch_name, author):
+        """Write all edits as one commit on top of the base and create
+        branch_name pointing at it. Returns the new commit SHA."""
+        if not self.files:
+            raise Exception(f"No changes to commit on {branch_name}")
+
+        base_commit = self.repo.get_git_commit(self.base_sha)
+        tree = self.repo.create_git_tree(
+            [
+                InputGitTreeElement(path, "100644", "blob", content=content)
+                for path, content in self.files.items()
+            ],
+            base_tree=base_commit.tree,
+        )
+        commit = self.repo.create_git_commit(
+            self.commit_message(), tree, [base_commit], author=author
+        )
+        log.info(f"Created commit {commit.sha} with {len(self.files)} file(s)")
+
+        self.repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=commit.sha)
+        snapshot.set_head_sha(self.repo, branch_name, commit.sha)
+        log.info(f"Created branch {branch_name} on {commit.sha}")
+        return commit.sha
@@ -0,0 +1,22 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+
+import http_session
+import standins
+import util
+
+
+@pytest.fixture
+def maven():
+    """A Maven stand-in behind a fresh, non-retrying HTTP session."""
+    with standins.MavenStandIn() as server:
+        previous = http_session.set_session(http_session.create_session(retries=0))
+        util.clear_gv_catalogs()
+        yield server
+        util.clear_gv_catalogs()
+        http_session.close_session()
+        http_session.set_session(previous)
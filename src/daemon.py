@@ -0,0 +1,124 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# relbot serve: run the regular jobs on internal schedules in one long-lived
+# process.
+#
+# The GitHub client, the repos, the connection pools and the HTTP cache stay
+# warm between runs. What a single run caches about branches and upstream
+# versions is dropped after every job, so each run sees fresh state and memory
+# does not grow with the number of runs.
+#
+
+
+import logging
+import os
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import http_cache
+import http_session
+import ratelimit
+import snapshot
+import tracing
+import util
+from tasks import task_context
+
+log = logging.getLogger(__name__)
+
+Job = namedtuple("Job", ["name", "argv", "interval"])
+
+# Intervals are in seconds, and can be overridden with RELBOT_SERVE_<NAME>,
+# like RELBOT_SERVE_UPDATE_MAIN=300
+JOBS = (
+    Job("update-main", ("android-components", "update-main"), 900),
+    Job("update-releases", ("android-components", "update-releases"), 1800),
+    Job(
+        "update-reference-browser",
+        ("reference-browser", "update-android-components"),
+        3600,
+    ),
+)
+
+
+def jobs_from_env(jobs=JOBS):
+    """Return jobs with their intervals overridden from the environment."""
+    result = []
+    for job in jobs:
+        name = job.name.upper().replace("-", "_")
+        if interval := os.getenv(f"RELBOT_SERVE_{name}"):
+            job = job._replace(interval=int(interval))
+        result.append(job)
+    return result
+
+
+def clear_run_caches():
+    """Forget what the last run learned about branches and upstream versions."""
+    snapshot.clear()
+    util.clear_gv_catalogs()
+    util.clear_release_branches()
+
+
+@contextmanager
+def serving_http_cache():
+    """Keep upstream metadata in an HTTP cache while serving. Without
+    RELBOT_CACHE_DIR the cache lives in a temporary directory that is removed
+    when serving stops. The cache bounds its own size."""
+    if (cache := http_session.get_cache()) is not None:
+        yield cache
+        return
+    with tempfile.TemporaryDirectory(prefix="relbot-cache-") as path:
+        cache = http_cache.HttpCache(path)
+        http_session.set_cache(cache)
+        try:
+            yield cache
+        finally:
+            http_session.set_cache(None)
+
+
+def run_isolated(name, fn):
+    """Run fn() as a run of its own called name. Failures are logged, not
+    raised, and what the run cached about branches is dropped after it."""
+    start = time.monotonic()
+    with task_context(name):
+        try:
+            fn()
+            log.info(f"{name} finished in {time.monotonic() - start:.1f}s")
+        except (Exception, SystemExit):
+            log.exception(f"{name} failed")
+        finally:
+            clear_run_caches()
+            if budget := ratelimit.get_budget():
+                log.info(f"GitHub API budget: {budget.report()}")
+                budget.reset_report()
+            tracing.flush()
+
+
+def run_job(job, run):
+    """Run job with run(argv). A failing job is logged, not raised, so the
+    other jobs keep running."""
+    run_isolated(job.name, lambda: run(job.argv))
+
+
+def serve(run, stop, jobs=None, clock=time.monotonic):
+    """Run every job with run(argv) once, then again every job.interval
+    seconds, until the threading.Event stop is set. Jobs run one at a time,
+    in order of when they are due."""
+    jobs = jobs_from_env() if jobs is None else jobs
+    due = {job.name: clock() for job in jobs}
+    log.info(
+        "Serving " + ", ".join(f"{job.name} every {job.interval}s" for job in jobs)
+    )
+    with serving_http_cache():
+        while not stop.is_set():
+            job = min(jobs, key=lambda job: due[job.name])
+            if (delay := due[job.name] - clock()) > 0:
+                stop.wait(delay)
+                continue
+            run_job(job, run)
+            due[job.name] = clock() + job.interval
+    log.info("Stopped serving")
@@ -0,0 +1,153 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Extract dependency versions from the Kotlin build files of A-C.
+#
+# All patterns are compiled once at import time. Each kind of file has a
+# single combined pattern, so one scan of a file finds every field it
+# declares, and the scan of a given file content is memoized. Values are
+# validated when they are handed out, with the validate_* helpers below.
+#
+
+
+import functools
+import re
+
+from mozilla_version.mobile import MobileVersion
+
+GV_VERSION_RE = re.compile(r"^\d{2,}\.\d\.\d{14}$")
+AS_VERSION_LEGACY_RE = re.compile(r"(^\d+)\.\d+\.\d+$")
+AS_VERSION_RE = re.compile(r"(^\d+)\.\d+$")
+GLEAN_VERSION_RE = re.compile(r"^\d+\.\d+.\d+$")
+
+
+def validate_gv_version(v):
+    """Validate that v is in the format of 82.0.20201027185343.
+    Returns v or raises an exception."""
+    if not GV_VERSION_RE.match(v):
+        raise Exception(f"Invalid GV version {v}")
+    return v
+
+
+def validate_gv_channel(c):
+    """Validate that c is release, production or beta"""
+    if c not in ("release", "beta", "nightly"):
+        raise Exception(f"Invalid GV channel {c}")
+    return c
+
+
+def validate_ac_version(v):
+    """Validate that v is a valid A-C version. Returns v or raises an exception."""
+    MobileVersion.parse(v)
+    return v
+
+
+def validate_as_version(v):
+    """Validate that v is in the format of 100.0 Returns v or raises an exception."""
+
+    if match := AS_VERSION_LEGACY_RE.match(v):
+        # application-services used to have its own 3-component version system,
+        # ending with version 97
+        if int(match.group(1)) <= 97:
+            return v
+
+    if match := AS_VERSION_RE.match(v):
+        # Application-services switched to following the 2-component the
+        # Firefox version number in v114
+        if int(match.group(1)) >= 114:
+            return v
+    raise Exception(f"Invalid version format {v}")
+
+
+def validate_as_channel(c):
+    """Validate that c is a valid app-services channel."""
+    if c in ("staging", "nightly_staging"):
+        # These are channels are valid, but only used for preview builds.  We don't have
+        # any way of auto-updating them
+        raise Exception(f"Can't update AS channel {c}")
+    if c not in ("release", "nightly"):
+        raise Exception(f"Invalid AS channel {c}")
+    return c
+
+
+def validate_glean_version(v):
+    """Validate that v is in the format of 63.0.2. Returns v or raises an exception."""
+    if not GLEAN_VERSION_RE.match(v):
+        raise Exception(f"Invalid version format {v}")
+    return v
+
+
+# The fields declared by each kind of file, as (field, pattern) pairs. Every
+# pattern has exactly one named group, called like the field.
+FILE_FIELDS = {
+    # Gecko.kt
+    "gecko": (
+        ("gv_version", r'version\(?\)? = "(?P<gv_version>[^"]*)"'),
+        (
+            "gv_channel",
+            r"channel\(?\)? = GeckoChannel.(?P<gv_channel>NIGHTLY|BETA|RELEASE)",
+        ),
+    ),
+    # DependenciesPlugin.kt, which held the A-S version before Fx 114
+    "dependencies": (
+        ("glean_version", r'const val mozilla_glean = "(?P<glean_version>[^"]*)"'),
+        ("as_version", r'const val mozilla_appservices = "(?P<as_version>[^"]*)"'),
+    ),
+    # ApplicationServices.kt
+    "app_services": (
+        ("as_version", r'val VERSION = "(?P<as_version>[\d\.]+)"'),
+        (
+            "as_channel",
+            r"val CHANNEL = ApplicationServicesChannel."
+            r"(?P<as_channel>NIGHTLY|NIGHTLY_STAGING|STAGING|RELEASE)",
+        ),
+    ),
+    # buildSrc/src/main/java/AndroidComponents.kt
+    "android_components": (("ac_version", r'VERSION = "(?P<ac_version>[^"]*)"'),),
+}
+
+FILE_PATTERNS = {
+    kind: re.compile("|".join(pattern for _, pattern in fields), re.MULTILINE)
+    for kind, fields in FILE_FIELDS.items()
+}
+
+VALIDATORS = {
+    "gv_version": validate_gv_version,
+    "gv_channel": lambda c: validate_gv_channel(c.lower()),
+    "glean_version": validate_glean_version,
+    "as_version": validate_as_version,
+    "as_channel": lambda c: validate_as_channel(c.lower()),
+    "ac_version": validate_ac_version,
+}
+
+
+@functools.lru_cache(maxsize=128)
+def scan(kind, src):
+    """Return {field: raw value} for the first occurrence of every field of
+    kind in src, found in a single pass over src."""
+    wanted = len(FILE_FIELDS[kind])
+    values = {}
+    for match in FILE_PATTERNS[kind].finditer(src):
+        field = match.lastgroup
+        if field not in values:
+            values[field] = match[field]
+            if len(values) == wanted:
+                break
+    return values
+
+
+def extract(kind, src):
+    """Return {field: validated value} for every field of kind found in src.
+    Raises if any of them is invalid."""
+    return {field: VALIDATORS[field](value) for field, value in scan(kind, src).items()}
+
+
+def extract_field(kind, src, field):
+    """Return the validated value of field in src, or None if src does not
+    declare it. Other fields of src are not validated."""
+    value = scan(kind, src).get(field)
+    if value is None:
+        return None
+    return VALIDATORS[field](value)
@@ -0,0 +1,80 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Remember what the last "nothing to do" decision of every task was based on.
+#
+# An update of a dependency on a branch stays a no-op for as long as neither
+# the branch nor the upstream metadata it was checked against change. For every
+# (repository, branch, task) the state store keeps the head commit of the
+# branch, the dependency channel found on it and a fingerprint of the upstream
+# metadata. The next run confirms a no-op from the branch head and the
+# metadata validators alone, and skips reading dependency files and
+# per-release artifacts.
+#
+
+
+import threading
+
+import state
+
+
+class FingerprintStore:
+    """The inputs of the last no-op decision per (repository, branch, task),
+    kept in a state.StateStore."""
+
+    def __init__(self, store=None):
+        self.store = store or state.StateStore()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def unchanged(self, repo, branch, task, head_sha, upstream_for):
+        """Return True if the last decision of task on branch was a no-op,
+        branch is still at head_sha and upstream_for(channel) still returns
+        the upstream fingerprint that decision was based on."""
+        record = self.store.get_fingerprint(repo.full_name, branch, task)
+        unchanged = (
+            record is not None
+            and record.head_sha == head_sha
+            and upstream_for(record.channel) == record.upstream
+        )
+        with self._lock:
+            if unchanged:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return unchanged
+
+    def record(self, repo, branch, task, head_sha, channel, upstream):
+        """Remember that task found nothing to do on branch at head_sha,
+        given the channel and upstream fingerprint it checked."""
+        self.store.set_fingerprint(
+            repo.full_name, branch, task, head_sha, channel, upstream
+        )
+
+    def forget(self, repo, branch, task):
+        self.store.delete_fingerprint(repo.full_name, branch, task)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_store = None
+
+
+def install(store=None):
+    """Let tasks skip no-op runs recorded in store."""
+    global _store
+    _store = store or FingerprintStore(state.get_state() or state.state_from_env())
+    return _store
+
+
+def uninstall():
+    global _store
+    _store = None
+
+
+def get_store():
+    return _store
@@ -0,0 +1,152 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Read the state of one or more branches with a single GitHub GraphQL query.
+#
+# For every branch the head commit and the contents of the requested files at
+# that commit are returned together, so the dependency files relbot parses
+# (version.txt, Gecko.kt, DependenciesPlugin.kt, ...) cost one round trip per
+# batch of branches instead of one REST call per file. prefetch_branches()
+# feeds the result into the snapshot so the regular get_current_* readers
+# pick it up.
+#
+
+
+import json
+import logging
+import os
+
+import http_session
+import snapshot
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_API_URL = "https://api.github.com"
+
+
+def enabled():
+    """GraphQL prefetching is on unless RELBOT_GRAPHQL is set to 0."""
+    return os.getenv("RELBOT_GRAPHQL", "1") != "0"
+
+
+def graphql_url(repo):
+    """Return the GraphQL endpoint of the GitHub instance hosting repo."""
+    if url := os.getenv("RELBOT_GITHUB_GRAPHQL_URL"):
+        return url
+    api_url = repo.url.split("/repos/")[0]
+    if not api_url:
+        # Repositories fetched lazily only know their path. Set
+        # RELBOT_GITHUB_GRAPHQL_URL for GitHub Enterprise.
+        api_url = DEFAULT_API_URL
+    if api_url.endswith("/api/v3"):
+        # GitHub Enterprise
+        return api_url[: -len("/v3")] + "/graphql"
+    return f"{api_url}/graphql"
+
+
+def build_branch_state_query(owner, name, branches, paths):
+    """Return a query reading the head commit of every branch and the
+    contents of every path at that commit. Branches and paths are addressed
+    by position through the b<N> and f<N> aliases."""
+    files = "\n".join(
+        f"            f{i}: file(path: {json.dumps(path)}) "
+        "{ object { oid ... on Blob { text isBinary isTruncated } } }"
+        for i, path in enumerate(paths)
+    )
+    refs = "\n".join(
+        f"    b{i}: ref(qualifiedName: {json.dumps('refs/heads/' + branch)}) {{\n"
+        "      target {\n"
+        "        oid\n"
+        "        ... on Commit {\n"
+        f"{files}\n"
+        "        }\n"
+        "      }\n"
+        "    }"
+        for i, branch in enumerate(branches)
+    )
+    return (
+        f"query {{\n  repository(owner: {json.dumps(owner)}, name: {json.dumps(name)})"
+        f" {{\n{refs}\n  }}\n}}\n"
+    )
+
+
+def execute(repo, query, token=None):
+    """Run query against the GraphQL endpoint of repo and return its data."""
+    token = token or os.getenv("GITHUB_TOKEN")
+    headers = {"Authorization": f"bearer {token}"} if token else {}
+    r = http_session.post(
+        graphql_url(repo), service="github", json={"query": query}, headers=headers
+    )
+    r.raise_for_status()
+    result = r.json()
+    if result.get("errors"):
+        messages = "; ".join(e.get("message", "?") for e in result["errors"])
+        raise Exception(f"GraphQL query failed: {messages}")
+    return result["data"]
+
+
+def read_branch_states(repo, branches, paths, token=None):
+    """Return {branch: {"sha": head_sha, "files": {path: (blob_sha, text)}}}
+    for all branches in a single query. Files that do not exist on a branch,
+    and binary or truncated ones, are left out; branches that do not exist
+    map to None."""
+    if not branches:
+        return {}
+    owner, name = repo.full_name.split("/", 1)
+    data = execute(repo, build_branch_state_query(owner, name, branches, paths), token)
+    states = {}
+    for i, branch in enumerate(branches):
+        ref = data["repository"][f"b{i}"]
+        if ref is None:
+            states[branch] = None
+            continue
+        files = {}
+        for j, path in enumerate(paths):
+            entry = ref["target"].get(f"f{j}")
+            if entry is None or entry["object"] is None:
+                continue
+            blob = entry["object"]
+            # Left to the REST readers. A truncated text would otherwise be
+            # committed back as a truncated file by ChangeSet.
+            if (
+                blob.get("isBinary")
+                or blob.get("isTruncated")
+                or blob.get("text") is None
+            ):
+                continue
+            files[path] = (blob["oid"], blob["text"])
+        states[branch] = {"sha": ref["target"]["oid"], "files": files}
+    return states
+
+
+def read_branch_state(repo, branch, paths, token=None):
+    """Return the state of a single branch, see read_branch_states()."""
+    return read_branch_states(repo, [branch], paths, token)[branch]
+
+
+def prefetch_branches(repo, branches, paths, token=None):
+    """Load the heads of branches and the contents of paths into the snapshot
+    with one query. Failures are logged and left to the REST readers."""
+    if not enabled():
+        return {}
+    try:
+        states = read_branch_states(repo, branches, paths, token)
+    except Exception as e:
+        log.warning(f"Could not prefetch {repo.full_name} branches via GraphQL: {e}")
+        return {}
+    for branch, state in states.items():
+        if state is None:
+            continue
+        snapshot.set_head_sha(repo, branch, state["sha"])
+        for path, (blob_sha, text) in state["files"].items():
+            snapshot.set_contents(
+                repo,
+                path,
+                state["sha"],
+                snapshot.SnapshotFile(path, blob_sha, text.encode("utf8")),
+            )
+    log.info(f"Prefetched {len(branches)} branch(es) of {repo.full_name} via GraphQL")
+    return states
@@ -0,0 +1,169 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# On-disk conditional-request cache for upstream metadata.
+#
+# Responses that carry an ETag or Last-Modified validator are stored on disk.
+# The next request for the same URL is sent with If-None-Match and
+# If-Modified-Since, and a 304 answer is served from the stored copy. Point
+# RELBOT_CACHE_DIR at a directory that is persisted between runs (for example
+# with actions/cache) so that idle cron runs only exchange validators.
+#
+
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Headers that are replayed on a response served from disk
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class HttpCache:
+    """Size-bounded on-disk store of validated responses, keyed by URL."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return f"{base}.json", f"{base}.body"
+
+    def _load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get("url") != url:
+            return None, None
+        return meta, body
+
+    def _store(self, url, response):
+        meta_path, body_path = self._paths(url)
+        meta = {
+            "url": url,
+            "stored_at": time.time(),
+            "headers": {
+                name: response.headers[name]
+                for name in STORED_HEADERS
+                if name in response.headers
+            },
+        }
+        with self._lock:
+            for path, data, mode in (
+                (body_path, response.content, "wb"),
+                (meta_path, json.dumps(meta), "w"),
+            ):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = {}
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext not in (".json", ".body"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            size, mtime = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_bytes:
+                break
+            for ext in (".json", ".body"):
+                try:
+                    os.remove(os.path.join(self.directory, key + ext))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            log.debug(f"Evicted {key} from the HTTP cache")
+
+    def get(self, session, url, **kwargs):
+        """GET url with session, revalidating against the stored copy."""
+        meta, body = self._load(url)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if meta is not None:
+            if etag := meta["headers"].get("ETag"):
+                headers["If-None-Match"] = etag
+            if last_modified := meta["headers"].get("Last-Modified"):
+                headers["If-Modified-Since"] = last_modified
+
+        response = session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += len(body)
+            try:
+                # Only keeps the LRU order, see _evict()
+                os.utime(self._paths(url)[1])
+            except FileNotFoundError:
+                # Evicted by a concurrent _store(); the body is already loaded
+                pass
+            log.debug(f"Serving {url} from the HTTP cache")
+            return _response_from_cache(url, meta, body, response)
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            self._store(url, response)
+        return response
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def _response_from_cache(url, meta, body, not_modified):
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response.url = url
+    response.request = not_modified.request
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.from_cache = True
+    return response
+
+
+def cache_from_env():
+    """Return an HttpCache for RELBOT_CACHE_DIR, or None when it is not set."""
+    directory = os.getenv("RELBOT_CACHE_DIR")
+    if not directory:
+        return None
+    max_bytes = int(os.getenv("RELBOT_CACHE_MAX_BYTES") or DEFAULT_MAX_BYTES)
+    return HttpCache(os.path.join(directory, "http"), max_bytes=max_bytes)
@@ -0,0 +1,333 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Shared HTTP session for all Maven and Taskcluster lookups.
+#
+# Every upstream request goes through get() so that connections to the same
+# host are pooled and kept alive for the whole run instead of paying a new
+# TCP+TLS handshake per request. The session can be swapped with
+# set_session(), for example to point relbot at a local stand-in server.
+# When RELBOT_CACHE_DIR is set, GETs are revalidated against the on-disk
+# http_cache instead of being downloaded in full.
+#
+
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from github.Requester import Requester, RequestsResponse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import http_cache
+
+log = logging.getLogger(__name__)
+
+# maven.mozilla.org, nightly.maven.mozilla.org and firefox-ci-tc
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 8
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30
+USER_AGENT = "relbot (+https://github.com/mozilla-mobile/relbot)"
+
+_session = None
+_session_lock = threading.Lock()
+
+_UNSET = object()
+_cache = _UNSET
+
+# Write requests GitHub counts towards its secondary rate limits
+WRITE_METHODS = ("POST", "PATCH", "PUT", "DELETE")
+
+# How often, and for how long at most, a GitHub request that hit a secondary
+# rate limit is retried after the Retry-After delay it was given
+GITHUB_LIMIT_RETRIES = 2
+GITHUB_MAX_RETRY_AFTER = 120
+
+# Describes one outbound request, for the observers below. service is one of
+# "github", "maven" or "taskcluster"; bytes is the size of the response body
+# that went over the wire.
+RequestEvent = namedtuple(
+    "RequestEvent",
+    ["service", "method", "url", "status", "bytes", "elapsed", "retries", "headers"],
+)
+
+# Called with (service, method, url) before every outbound request, and with a
+# RequestEvent after it
+_before_request_hooks = []
+_observers = []
+
+
+def _int_from_env(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def create_session(pool_connections=None, pool_maxsize=None, retries=None):
+    """Return a new requests.Session with per-host keep-alive connection pools.
+
+    pool_connections is the number of hosts to keep a pool for, pool_maxsize
+    the number of connections kept alive per host. Unset values come from
+    RELBOT_HTTP_POOL_CONNECTIONS, RELBOT_HTTP_POOL_MAXSIZE and
+    RELBOT_HTTP_RETRIES, or the defaults above."""
+    if pool_connections is None:
+        pool_connections = _int_from_env(
+            "RELBOT_HTTP_POOL_CONNECTIONS", DEFAULT_POOL_CONNECTIONS
+        )
+    if pool_maxsize is None:
+        pool_maxsize = _int_from_env("RELBOT_HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)
+    if retries is None:
+        retries = _int_from_env("RELBOT_HTTP_RETRIES", DEFAULT_RETRIES)
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        ),
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "User-Agent": USER_AGENT,
+        }
+    )
+    return session
+
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def set_session(session):
+    """Replace the shared session and return the previous one. Passing None
+    makes the next get_session() call create a fresh default session."""
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+    return previous
+
+
+def close_session():
+    """Close the shared session and drop all pooled connections."""
+    previous = set_session(None)
+    if previous is not None:
+        previous.close()
+
+
+def get_cache():
+    """Return the shared HttpCache, or None when caching is disabled."""
+    global _cache
+    if _cache is _UNSET:
+        with _session_lock:
+            if _cache is _UNSET:
+                _cache = http_cache.cache_from_env()
+    return _cache
+
+
+def set_cache(cache):
+    """Replace the shared HttpCache (None disables caching) and return the
+    previous one."""
+    global _cache
+    with _session_lock:
+        previous, _cache = _cache, cache
+    return None if previous is _UNSET else previous
+
+
+def add_before_request_hook(hook):
+    """Call hook(service, method, url) before every outbound request. Hooks
+    may block, for example to pace requests."""
+    _before_request_hooks.append(hook)
+
+
+def remove_before_request_hook(hook):
+    _before_request_hooks.remove(hook)
+
+
+def add_observer(observer):
+    """Call observer(event) with a RequestEvent after every outbound request."""
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    _observers.remove(observer)
+
+
+def is_write(method, url):
+    """Whether a request changes state upstream. GraphQL queries are sent
+    with POST but only read."""
+    return method in WRITE_METHODS and not url.endswith("/graphql")
+
+
+def service_for_url(url):
+    """Classify an upstream URL, for observers."""
+    if "/api/index/" in url:
+        return "taskcluster"
+    return "maven"
+
+
+def _send(service, method, url, send):
+    for hook in list(_before_request_hooks):
+        hook(service, method, url)
+    start = time.monotonic()
+    response = send()
+    elapsed = time.monotonic() - start
+    if _observers:
+        retries = getattr(response, "relbot_retries", 0)
+        if raw_retries := getattr(getattr(response, "raw", None), "retries", None):
+            retries += len(raw_retries.history)
+        from_cache = getattr(response, "from_cache", False)
+        event = RequestEvent(
+            service,
+            method,
+            url,
+            304 if from_cache else response.status_code,
+            0 if from_cache else len(response.content),
+            elapsed,
+            retries,
+            response.headers,
+        )
+        for observer in list(_observers):
+            observer(event)
+    return response
+
+
+def get(url, service=None, **kwargs):
+    """GET url through the shared session. Returns a requests.Response."""
+    kwargs.setdefault("timeout", _int_from_env("RELBOT_HTTP_TIMEOUT", DEFAULT_TIMEOUT))
+    log.debug(f"GET {url}")
+    if cache := get_cache():
+        send = lambda: cache.get(get_session(), url, **kwargs)  # noqa: E731
+    else:
+        send = lambda: get_session().get(url, **kwargs)  # noqa: E731
+    return _send(service or service_for_url(url), "GET", url, send)
+
+
+def post(url, service=None, **kwargs):
+    """POST to url through the shared session. Never cached or retried."""
+    kwargs.setdefault("timeout", _int_from_env("RELBOT_HTTP_TIMEOUT", DEFAULT_TIMEOUT))
+    log.debug(f"POST {url}")
+    return _send(
+        service or service_for_url(url),
+        "POST",
+        url,
+        lambda: get_session().post(url, **kwargs),
+    )
+
+
+def get_all(urls, concurrent=True):
+    """GET all urls and return the responses in the same order. With
+    concurrent set the requests are made in parallel over the shared pool."""
+    urls = list(urls)
+    if not concurrent or len(urls) < 2:
+        return [get(url) for url in urls]
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        # Run every request in a copy of the caller's context, so hooks see
+        # the task and operation it is made for
+        futures = [
+            executor.submit(contextvars.copy_context().run, get, url) for url in urls
+        ]
+        return [future.result() for future in futures]
+
+
+class GithubConnection:
+    """PyGithub connection class that sends requests over the shared session.
+
+    PyGithub keeps a single connection object per client and stores the
+    pending request on it, which is not safe to use from several threads.
+    Once installed with install_github_connection(), a new (cheap) instance
+    is created for every request while the underlying keep-alive connections
+    are pooled by the shared session."""
+
+    protocol = "https"
+
+    def __init__(
+        self, host, port=None, strict=False, timeout=None, retry=None, **kwargs
+    ):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.verify = kwargs.get("verify", True)
+
+    def request(self, verb, url, input, headers):
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+
+    def getresponse(self):
+        port = f":{self.port}" if self.port else ""
+        url = f"{self.protocol}://{self.host}{port}{self.url}"
+        return RequestsResponse(_send("github", self.verb, url, self._send))
+
+    def _send(self):
+        url = f"{self.protocol}://{self.host}"
+        if self.port:
+            url += f":{self.port}"
+        retries = 0
+        while True:
+            r = get_session().request(
+                self.verb,
+                url + self.url,
+                headers=self.headers,
+                data=self.input,
+                timeout=self.timeout,
+                verify=self.verify,
+                allow_redirects=False,
+            )
+            # Secondary rate limits come with a Retry-After header. Wait it
+            # out instead of failing halfway through a task.
+            retry_after = r.headers.get("Retry-After")
+            if (
+                r.status_code in (403, 429)
+                and retry_after is not None
+                and retry_after.isdigit()
+                and int(retry_after) <= GITHUB_MAX_RETRY_AFTER
+                and retries < GITHUB_LIMIT_RETRIES
+            ):
+                retries += 1
+                log.warning(
+                    f"GitHub rate limit hit on {self.verb} {self.url}, "
+                    f"retrying in {retry_after}s"
+                )
+                time.sleep(int(retry_after))
+                continue
+            r.relbot_retries = retries
+            return r
+
+    def close(self):
+        pass
+
+
+class HttpGithubConnection(GithubConnection):
+    protocol = "http"
+
+
+def install_github_connection():
+    """Make all PyGithub clients use GithubConnection."""
+    Requester.injectConnectionClasses(HttpGithubConnection, GithubConnection)
@@ -0,0 +1,285 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Keep a run within the GitHub API rate limits.
+#
+# The budget follows the X-RateLimit-* headers of every GitHub response, paces
+# write requests so bursts of PR creation stay under the secondary limits, and
+# hands out calls to tasks by priority: main first, then the newest release
+# branches. A task the remaining budget cannot cover waits for the limit to
+# reset if that is soon, and is deferred to the next run otherwise. Nothing
+# fails because relbot ran out of API calls.
+#
+
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+
+import http_session
+from tasks import DEFERRED
+
+log = logging.getLogger(__name__)
+
+# GitHub asks integrators to wait at least a second between write requests
+DEFAULT_WRITE_INTERVAL = 1.0
+
+# Calls left untouched for whoever else shares the token
+DEFAULT_RESERVE = 50
+
+# The longest a task waits for the rate limit to reset before it is deferred
+DEFAULT_MAX_WAIT = 300
+
+# Rough number of GitHub calls a task makes when it has to open a PR: reading
+# the files it needs, checking for an existing PR branch, the Git Data API
+# writes, the PR itself and its labels.
+TASK_COSTS = {
+    "update-geckoview": 30,
+    "update-as": 15,
+    "update-android-components": 20,
+}
+DEFAULT_TASK_COST = 20
+
+# Lower priorities run first
+PRIORITY_MAIN = 0
+PRIORITY_RELEASE = 1
+
+ScheduledTask = namedtuple("ScheduledTask", ["name", "fn", "priority", "cost"])
+
+RateLimit = namedtuple("RateLimit", ["limit", "remaining", "reset", "used"])
+
+
+def task_cost(kind):
+    """Return the estimated number of GitHub calls of a task of this kind."""
+    return TASK_COSTS.get(kind, DEFAULT_TASK_COST)
+
+
+def _float_from_env(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class RateLimitBudget:
+    def __init__(
+        self,
+        reserve=None,
+        write_interval=None,
+        max_wait=None,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self.reserve = (
+            reserve
+            if reserve is not None
+            else int(_float_from_env("RELBOT_RATELIMIT_RESERVE", DEFAULT_RESERVE))
+        )
+        self.write_interval = (
+            write_interval
+            if write_interval is not None
+            else _float_from_env("RELBOT_WRITE_INTERVAL", DEFAULT_WRITE_INTERVAL)
+        )
+        self.max_wait = (
+            max_wait
+            if max_wait is not None
+            else _float_from_env("RELBOT_RATELIMIT_MAX_WAIT", DEFAULT_MAX_WAIT)
+        )
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_write = None
+        # Latest RateLimit seen per resource (core, graphql, ...)
+        self.limits = {}
+        self.calls = Counter()
+        self.rate_limited = 0
+        self.waited = 0.0
+        # Estimated calls of the tasks currently running
+        self.committed = 0
+        self.deferred = []
+
+    def before_request(self, service, method, url):
+        """Space out GitHub write requests by write_interval."""
+        if service != "github" or not http_session.is_write(method, url):
+            return
+        with self._write_lock:
+            if self._last_write is not None:
+                delay = self._last_write + self.write_interval - self._clock()
+                if delay > 0:
+                    self._sleep(delay)
+                    with self._lock:
+                        self.waited += delay
+            self._last_write = self._clock()
+
+    def observe(self, event):
+        """Record a GitHub response and the rate limit it reports."""
+        if event.service != "github":
+            return
+        headers = event.headers
+        with self._lock:
+            kind = (
+                "writes" if http_session.is_write(event.method, event.url) else "reads"
+            )
+            self.calls[kind] += 1
+            if event.status in (403, 429) and (
+                "Retry-After" in headers or headers.get("X-RateLimit-Remaining") == "0"
+            ):
+                self.rate_limited += 1
+            if "X-RateLimit-Remaining" in headers:
+                resource = headers.get("X-RateLimit-Resource", "core")
+                self.limits[resource] = RateLimit(
+                    int(headers.get("X-RateLimit-Limit", 0)),
+                    int(headers["X-RateLimit-Remaining"]),
+                    int(headers.get("X-RateLimit-Reset", 0)),
+                    int(headers.get("X-RateLimit-Used", 0)),
+                )
+
+    def remaining(self, resource="core"):
+        """Return the calls left for resource, or None if not known yet."""
+        with self._lock:
+            limit = self.limits.get(resource)
+            return limit.remaining if limit else None
+
+    def acquire(self, name, cost):
+        """Set aside cost calls for task name. Waits for the rate limit to
+        reset if the budget cannot cover the task. Returns False if the task
+        should be deferred instead."""
+        with self._lock:
+            limit = self.limits.get("core")
+            if limit is None or limit.remaining - self.committed - self.reserve >= cost:
+                self.committed += cost
+                return True
+            wait = limit.reset - self._clock()
+        if wait > self.max_wait:
+            log.warning(
+                f"Deferring {name}: it needs about {cost} GitHub calls, "
+                f"{limit.remaining} are left until the reset in {int(wait)}s"
+            )
+            with self._lock:
+                self.deferred.append(name)
+            return False
+        log.warning(f"Waiting {int(max(wait, 0))}s for the GitHub rate limit reset")
+        self._sleep(max(wait, 0))
+        with self._lock:
+            self.waited += max(wait, 0)
+            # The next response tells us the new budget
+            self.limits.pop("core", None)
+            self.committed += cost
+        return True
+
+    def release(self, cost):
+        """Give back the calls set aside by acquire, once the task is done."""
+        with self._lock:
+            self.committed -= cost
+
+    def reset_report(self):
+        """Start counting a new run. The known rate limits are kept."""
+        with self._lock:
+            self.calls.clear()
+            self.rate_limited = 0
+            self.waited = 0.0
+            self.deferred = []
+
+    def report(self):
+        """Return what this run used of the budget."""
+        with self._lock:
+            return {
+                "reads": self.calls["reads"],
+                "writes": self.calls["writes"],
+                "rate_limited": self.rate_limited,
+                "waited": round(self.waited, 1),
+                "deferred": list(self.deferred),
+                "remaining": {
+                    resource: f"{limit.remaining}/{limit.limit}"
+                    for resource, limit in sorted(self.limits.items())
+                },
+            }
+
+
+_budget = None
+
+
+def install(budget=None):
+    """Track and pace all GitHub requests of this process with budget."""
+    global _budget
+    uninstall()
+    _budget = budget or RateLimitBudget()
+    http_session.add_before_request_hook(_budget.before_request)
+    http_session.add_observer(_budget.observe)
+    return _budget
+
+
+def uninstall():
+    global _budget
+    if _budget is not None:
+        http_session.remove_before_request_hook(_budget.before_request)
+        http_session.remove_observer(_budget.observe)
+        _budget = None
+
+
+def get_budget():
+    return _budget
+
+
+class _Turns:
+    """Lets the tasks of a schedule claim their budget one after the other,
+    in priority order, however the worker threads happen to start them."""
+
+    def __init__(self, count):
+        self.count = count
+        self.next = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def turn(self, index):
+        with self._condition:
+            self._condition.wait_for(lambda: self.next == index)
+        try:
+            yield
+        finally:
+            with self._condition:
+                # Start over for the next run of the same schedule
+                self.next = (self.next + 1) % self.count
+                self._condition.notify_all()
+
+
+def _budgeted(budget, task, turns, index):
+    def run():
+        # Tasks run side by side, but a task only claims calls once every
+        # task of higher priority has, so a low budget holds back the lower
+        # priority ones.
+        with turns.turn(index):
+            acquired = budget.acquire(task.name, task.cost)
+        if not acquired:
+            return DEFERRED
+        try:
+            return task.fn()
+        finally:
+            budget.release(task.cost)
+
+    return run
+
+
+def schedule(scheduled_tasks, budget=None):
+    """Order scheduled_tasks by priority and return them as (name, callable)
+    pairs for tasks.run_tasks. With a budget, tasks claim their estimated
+    calls in priority order, and tasks it cannot afford return DEFERRED
+    instead of running."""
+    budget = budget or get_budget()
+    ordered = sorted(scheduled_tasks, key=lambda task: task.priority)
+    if budget is None:
+        return [(task.name, task.fn) for task in ordered]
+    total = sum(task.cost for task in ordered)
+    log.info(
+        f"Scheduling {len(ordered)} task(s), estimated {total} GitHub calls, "
+        f"{budget.remaining()} remaining"
+    )
+    turns = _Turns(len(ordered))
+    return [
+        (task.name, _budgeted(budget, task, turns, index))
+        for index, task in enumerate(ordered)
+    ]
@@ -3,18 +3,19 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/
 
 
-from util import update_android_components_nightly
+from tasks import raise_for_failures
+from util import NightlyTarget, update_android_components_nightly_targets
 
 
 def update_android_components_in_rb(ac_repo, rb_repo, author, debug):
     release_branch_name = "master"  # RB Only has master
 
-    return update_android_components_nightly(
+    results = update_android_components_nightly_targets(
         ac_repo,
-        rb_repo,
-        target_path="",
+        [NightlyTarget(rb_repo, path="", branch=release_branch_name)],
         author=author,
         debug=debug,
-        release_branch_name=release_branch_name,
         dry_run=False,
     )
+    raise_for_failures(results)
+    return results[0].result
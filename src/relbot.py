@@ -23,72 +23,196 @@
 
 import logging
 import os
+import signal
 import sys
+import threading
 
-from github import Github, InputGitAuthor, enable_console_debug_logging
+import tasks
 
-import android_components
-import reference_browser
+# Everything else, PyGithub included, is imported once the command line is
+# known to be valid, and only for the command that runs. See
+# benchmarks/bench_startup.py.
 
 log = logging.getLogger(__name__)
 logging.basicConfig(
-    format="%(asctime)s - %(name)s.%(funcName)s:%(lineno)s - %(levelname)s - %(message)s",  # noqa E501
+    format="%(asctime)s - %(name)s.%(funcName)s:%(lineno)s - %(levelname)s - %(context)s%(message)s",  # noqa E501
     level=logging.INFO,
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(tasks.TaskContextFilter())
 
 
 DEFAULT_ORGANIZATION = "st3fan"
 DEFAULT_AUTHOR_NAME = "MickeyMoz"
 DEFAULT_AUTHOR_EMAIL = "sebastian@mozilla.com"
-USAGE = "usage: relbot <android-components|reference-browser> command..."  # noqa E501
+USAGE = "usage: relbot <android-components|reference-browser> command... | relbot <serve|webhooks> | relbot batch <command>..."  # noqa E501
+BATCH_USAGE = "usage: relbot batch <command>... | relbot batch --file <file>"
+
+COMMANDS = {
+    "android-components": ("update-main", "update-releases"),
+    "reference-browser": ("update-android-components",),
+    "serve": (),
+    "batch": (),
+    "webhooks": (),
+}
+
+
+def usage_error(argv):
+    """Return the usage message to print if argv is not a valid command line,
+    or None."""
+    if len(argv) < 2 or argv[1] not in COMMANDS:
+        return USAGE
+    if argv[1] == "batch":
+        # The commands are checked by batch_usage_error() once they are read
+        return BATCH_USAGE if len(argv) < 3 else None
+    commands = COMMANDS[argv[1]]
+    if commands and (len(argv) < 3 or argv[2] not in commands):
+        return f"usage: relbot {argv[1]} <{','.join(commands)}>"
+    return None
+
+
+def batch_usage_error(argv, commands):
+    """Return the usage message to print if the commands of the batch
+    command line argv are not all valid, or None."""
+    if not commands:
+        return BATCH_USAGE
+    for command in commands:
+        if command[0] in ("batch", "serve", "webhooks"):
+            return f"relbot {command[0]} cannot run in a batch"
+        if message := usage_error([argv[0], *command]):
+            return message
+    return None
+
+
+class LazyRepo:
+    """A handle on the GitHub repository full_name that costs no API call
+    until something other than its name is needed."""
+
+    def __init__(self, github, full_name):
+        self.full_name = full_name
+        self._github = github
+        self._repo = None
+
+    def __getattr__(self, name):
+        if self._repo is None:
+            # A lazy Repository only fetches itself when one of its own
+            # attributes is read. Its methods work without it.
+            self._repo = self._github.get_repo(self.full_name, lazy=True)
+        return getattr(self._repo, name)
+
+    def __repr__(self):
+        # Log messages format repos by name
+        return self.full_name
 
 
 def main(argv, firefox_repo, rb_repo, author, debug=False, dry_run=False):
-    if len(argv) < 2:
-        print(USAGE)
+    if message := usage_error(argv):
+        print(message)
         sys.exit(1)
 
     # Android Components
     if argv[1] == "android-components":
-        if argv[2] == "update-main":
-            android_components.update_main(firefox_repo, author, dry_run)
-        elif argv[2] == "update-releases":
-            android_components.update_releases(firefox_repo, author, dry_run)
-        else:
-            print(
-                "usage: relbot android-components <update-{main,releases}>"  # noqa E501
-            )
-            sys.exit(1)
+        import android_components
+        import state
+
+        with state.recording(" ".join(argv[1:])):
+            if argv[2] == "update-main":
+                android_components.update_main(firefox_repo, author, dry_run)
+            elif argv[2] == "update-releases":
+                android_components.update_releases(firefox_repo, author, dry_run)
 
     # Reference Browser
     elif argv[1] == "reference-browser":
-        if argv[2] == "update-android-components":
-            reference_browser.update_android_components_in_rb(
-                firefox_repo, rb_repo, author, debug
-            )
-        else:
-            print("usage: relbot reference-browser <update-android-components>")
+        import reference_browser
+        import state
+
+        with state.recording(" ".join(argv[1:])):
+            if argv[2] == "update-android-components":
+                reference_browser.update_android_components_in_rb(
+                    firefox_repo, rb_repo, author, debug
+                )
+
+    # Run several of the above, sharing clients and caches
+    elif argv[1] == "batch":
+        import batch
+
+        # Read and check every command before running any
+        try:
+            commands = batch.parse_commands(argv[2:])
+        except (OSError, ValueError) as e:
+            print(e)
             sys.exit(1)
-
-    else:
-        print(USAGE)
-        sys.exit(1)
+        if message := batch_usage_error(argv, commands):
+            print(message)
+            sys.exit(1)
+        results = batch.run_batch(
+            commands,
+            lambda command: main(
+                [argv[0], *command], firefox_repo, rb_repo, author, debug, dry_run
+            ),
+        )
+        if status := batch.exit_status(results):
+            sys.exit(status)
+
+    # Run all of the above on a schedule, until stopped
+    elif argv[1] == "serve":
+        import daemon
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        daemon.serve(
+            lambda job_argv: main(
+                [argv[0], *job_argv], firefox_repo, rb_repo, author, debug, dry_run
+            ),
+            stop,
+        )
+
+    # Run what upstream publishes affect, until stopped
+    elif argv[1] == "webhooks":
+        import webhooks
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        webhooks.serve(
+            lambda action: webhooks.run_action(
+                action, firefox_repo, rb_repo, author, debug, dry_run
+            ),
+            stop,
+        )
 
 
 if __name__ == "__main__":
-    debug = os.getenv("DEBUG") is not None
-    if debug:
-        enable_console_debug_logging()
+    if message := usage_error(sys.argv):
+        print(message)
+        sys.exit(1)
 
     github_access_token = os.getenv("GITHUB_TOKEN")
     if not github_access_token:
         log.error("No GITHUB_TOKEN set. Exiting.")
         sys.exit(1)
 
+    from github import Github, InputGitAuthor, enable_console_debug_logging
+
+    import fingerprints
+    import http_session
+    import ratelimit
+    import state
+    import tracing
+
+    debug = os.getenv("DEBUG") is not None
+    if debug:
+        enable_console_debug_logging()
+
+    http_session.install_github_connection()
+    budget = ratelimit.install()
+    state.install()
+    fingerprints.install()
+    tracing.install_from_env()
+    # No request is made until a command needs one. The token is checked by
+    # the first of them.
     github = Github(github_access_token)
-    if github.get_user() is None:
-        log.error("Could not get authenticated user. Exiting.")
-        sys.exit(1)
 
     dry_run = os.getenv("DRY_RUN") == "True"
 
@@ -96,8 +220,8 @@ if __name__ == "__main__":
 
     repo_name_prefix = "staging-" if organization == "mozilla-releng" else ""
 
-    firefox_repo = github.get_repo(f"{organization}/{repo_name_prefix}firefox-android")
-    rb_repo = github.get_repo(f"{organization}/{repo_name_prefix}reference-browser")
+    firefox_repo = LazyRepo(github, f"{organization}/{repo_name_prefix}firefox-android")
+    rb_repo = LazyRepo(github, f"{organization}/{repo_name_prefix}reference-browser")
 
     author_name = os.getenv("AUTHOR_NAME") or DEFAULT_AUTHOR_NAME
     author_email = os.getenv("AUTHOR_EMAIL") or DEFAULT_AUTHOR_EMAIL
@@ -108,4 +232,11 @@ if __name__ == "__main__":
         f"as {author_email} / {author_name}"
     )
 
-    main(sys.argv, firefox_repo, rb_repo, author, debug, dry_run)
+    try:
+        main(sys.argv, firefox_repo, rb_repo, author, debug, dry_run)
+    finally:
+        log.info(f"GitHub API budget: {budget.report()}")
+        tracing.flush()
+        if cache := http_session.get_cache():
+            log.info(f"HTTP cache statistics: {cache.stats()}")
+        log.info(f"No-op fingerprints: {fingerprints.get_store().stats()}")
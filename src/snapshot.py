@@ -0,0 +1,125 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Per-run snapshot of repository contents.
+#
+# Branch names are resolved to a commit SHA once per run and file contents are
+# keyed on (repo, path, sha), so every get_current_* reader shares a single
+# fetch of each file per branch. relbot never writes to the branches it reads:
+# ChangeSet commits on top of them and creates a new PR branch, whose head it
+# records with set_head_sha(), so nothing read during a run goes stale. The
+# branches under a prefix, like the relbot/ PR branches, are listed once per
+# run with a single request, so checking whether one of them exists is a
+# lookup.
+#
+# Unlike repo.get_contents(), the readers here only take branch names and
+# commit SHAs as refs, not tags. Every relbot caller reads a branch.
+#
+
+
+import logging
+import re
+import threading
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+# Stand-in for a PyGithub ContentFile when contents come from elsewhere
+SnapshotFile = namedtuple("SnapshotFile", ["path", "sha", "decoded_content"])
+
+_lock = threading.Lock()
+_head_shas = {}
+_contents = {}
+# {(repo, prefix): set of branch names}, and a lock per listing
+_branch_names = {}
+_branch_name_locks = {}
+
+
+def _is_sha(ref):
+    return re.match(r"^[0-9a-f]{40}$", ref) is not None
+
+
+def get_head_sha(repo, ref):
+    """Return the commit SHA that ref, a branch name or a commit SHA,
+    currently points to. Branch names are resolved once per run. Tags and
+    other refs are not supported: they are looked up as branches."""
+    if _is_sha(ref):
+        return ref
+    key = (repo.full_name, ref)
+    with _lock:
+        if key in _head_shas:
+            return _head_shas[key]
+    sha = repo.get_git_ref(f"heads/{ref}").object.sha
+    log.debug(f"Resolved {repo.full_name}:{ref} to {sha}")
+    with _lock:
+        return _head_shas.setdefault(key, sha)
+
+
+def set_head_sha(repo, ref, sha):
+    """Record the head of ref when it is already known, for example from a
+    listing of branches, so it does not need to be resolved again."""
+    with _lock:
+        _head_shas[(repo.full_name, ref)] = sha
+        # A branch created during the run joins the listings it belongs to
+        for (full_name, prefix), names in _branch_names.items():
+            if full_name == repo.full_name and ref.startswith(prefix):
+                names.add(ref)
+
+
+def get_branch_names(repo, prefix):
+    """Return the names of the branches of repo that start with prefix. They
+    are listed once per run with one prefix-filtered request shared by all
+    threads, and their heads are recorded. Errors listing them are raised."""
+    key = (repo.full_name, prefix)
+    with _lock:
+        lock = _branch_name_locks.setdefault(key, threading.Lock())
+    with lock:
+        with _lock:
+            if key in _branch_names:
+                return set(_branch_names[key])
+        refs = list(repo.get_git_matching_refs(f"heads/{prefix}"))
+        log.debug(f"Listed {len(refs)} {prefix} branch(es) of {repo.full_name}")
+        with _lock:
+            names = _branch_names.setdefault(key, set())
+            for ref in refs:
+                name = ref.ref[len("refs/heads/") :]
+                names.add(name)
+                _head_shas.setdefault((repo.full_name, name), ref.object.sha)
+            return set(names)
+
+
+def get_contents(repo, path, ref):
+    """Return the ContentFile for path at ref, a branch name or a commit
+    SHA, fetching it at most once per resolved commit."""
+    sha = get_head_sha(repo, ref)
+    key = (repo.full_name, path, sha)
+    with _lock:
+        if key in _contents:
+            return _contents[key]
+    content_file = repo.get_contents(path, ref=sha)
+    with _lock:
+        return _contents.setdefault(key, content_file)
+
+
+def set_contents(repo, path, commit_sha, content_file):
+    """Record the contents of path at commit_sha when they are already known,
+    for example from a batched GraphQL read."""
+    with _lock:
+        _contents[(repo.full_name, path, commit_sha)] = content_file
+
+
+def get_decoded_contents(repo, path, ref):
+    """Return the contents of path at ref, a branch name or a commit SHA,
+    as a string."""
+    return get_contents(repo, path, ref).decoded_content.decode("utf8")
+
+
+def clear():
+    """Drop everything, typically at the end of a run."""
+    with _lock:
+        _head_shas.clear()
+        _contents.clear()
+        _branch_names.clear()
+        _branch_name_locks.clear()
@@ -0,0 +1,230 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# What relbot remembers between runs, in a SQLite database.
+#
+#   facts         upstream facts that never change once published, like the
+#                 Glean version a GeckoView build bundles
+#   fingerprints  the inputs of the last no-op decision of every task
+#   runs          the history of the last KEEP_RUNS runs and their outcome
+#
+# The database lives at RELBOT_STATE_DB, or at state.sqlite in
+# RELBOT_CACHE_DIR, and in memory when neither is set. The schema is upgraded
+# on open with the MIGRATIONS below; add a new entry to change it, never edit
+# an existing one. One connection is shared by all threads of a process, so
+# workers can use the store concurrently.
+#
+
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# How long to wait for another process holding the database
+DEFAULT_TIMEOUT = 30
+
+MIGRATIONS = (
+    """
+    CREATE TABLE facts (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        recorded_at REAL NOT NULL,
+        PRIMARY KEY (kind, key)
+    );
+    CREATE TABLE fingerprints (
+        repo TEXT NOT NULL,
+        branch TEXT NOT NULL,
+        task TEXT NOT NULL,
+        head_sha TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        upstream TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (repo, branch, task)
+    );
+    CREATE TABLE runs (
+        id INTEGER PRIMARY KEY,
+        command TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        finished_at REAL,
+        status TEXT,
+        error TEXT
+    );
+    """,
+)
+
+# How many runs the history keeps
+KEEP_RUNS = 1000
+
+Fingerprint = namedtuple("Fingerprint", ["head_sha", "channel", "upstream"])
+Run = namedtuple(
+    "Run", ["id", "command", "started_at", "finished_at", "status", "error"]
+)
+
+
+class StateStore:
+    """A SQLite database of what relbot learned and did, at path."""
+
+    def __init__(self, path=":memory:", timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        if path != ":memory:":
+            # Readers in other processes do not block the writer
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version > len(MIGRATIONS):
+                raise Exception(
+                    f"{self.path} has schema version {version}, newer than this "
+                    f"relbot knows ({len(MIGRATIONS)})"
+                )
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                log.info(f"Migrating {self.path} to schema version {number}")
+                # executescript() commits on its own, so the new version is
+                # set in the same script
+                self._db.executescript(
+                    f"BEGIN; {script}; PRAGMA user_version = {number}; COMMIT;"
+                )
+
+    def schema_version(self):
+        with self._lock:
+            return self._db.execute("PRAGMA user_version").fetchone()[0]
+
+    def _execute(self, sql, parameters=()):
+        with self._lock, self._db:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    #
+    # Upstream facts
+    #
+
+    def get_fact(self, kind, key):
+        """Return the value recorded for key, or None."""
+        rows = self._execute(
+            "SELECT value FROM facts WHERE kind = ? AND key = ?", (kind, key)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_fact(self, kind, key, value):
+        """Record value, anything JSON can hold, for key."""
+        self._execute(
+            "INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?)",
+            (kind, key, json.dumps(value), time.time()),
+        )
+
+    #
+    # No-op fingerprints, see fingerprints.py
+    #
+
+    def get_fingerprint(self, repo, branch, task):
+        rows = self._execute(
+            "SELECT head_sha, channel, upstream FROM fingerprints "
+            "WHERE repo = ? AND branch = ? AND task = ?",
+            (repo, branch, task),
+        )
+        return Fingerprint(*rows[0]) if rows else None
+
+    def set_fingerprint(self, repo, branch, task, head_sha, channel, upstream):
+        self._execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (repo, branch, task, head_sha, channel, upstream, time.time()),
+        )
+
+    def delete_fingerprint(self, repo, branch, task):
+        self._execute(
+            "DELETE FROM fingerprints WHERE repo = ? AND branch = ? AND task = ?",
+            (repo, branch, task),
+        )
+
+    #
+    # Run history
+    #
+
+    def start_run(self, command):
+        """Record the start of a run of command and return its id. Only the
+        last KEEP_RUNS runs are kept."""
+        with self._lock, self._db:
+            run_id = self._db.execute(
+                "INSERT INTO runs (command, started_at) VALUES (?, ?)",
+                (command, time.time()),
+            ).lastrowid
+            self._db.execute("DELETE FROM runs WHERE id <= ?", (run_id - KEEP_RUNS,))
+            return run_id
+
+    def finish_run(self, run_id, status, error=None):
+        self._execute(
+            "UPDATE runs SET finished_at = ?, status = ?, error = ? WHERE id = ?",
+            (time.time(), status, error, run_id),
+        )
+
+    def get_runs(self, limit=20):
+        """Return the last limit Runs, newest first."""
+        rows = self._execute(
+            f"SELECT {', '.join(Run._fields)} FROM runs ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+        return [Run(*row) for row in rows]
+
+
+def state_from_env():
+    """Return a StateStore at RELBOT_STATE_DB, or in RELBOT_CACHE_DIR, or in
+    memory when neither is set."""
+    if path := os.getenv("RELBOT_STATE_DB"):
+        return StateStore(path)
+    if directory := os.getenv("RELBOT_CACHE_DIR"):
+        return StateStore(os.path.join(directory, "state.sqlite"))
+    return StateStore()
+
+
+_state = None
+
+
+def install(store=None):
+    """Remember facts, fingerprints and runs of this process in store."""
+    global _state
+    _state = store or state_from_env()
+    return _state
+
+
+def uninstall():
+    global _state
+    _state = None
+
+
+def get_state():
+    return _state
+
+
+@contextmanager
+def recording(command):
+    """Record a run of command in the run history of the installed store."""
+    store = _state
+    if store is None:
+        yield
+        return
+    run_id = store.start_run(command)
+    try:
+        yield
+    except BaseException as e:
+        store.finish_run(run_id, "failed", f"{type(e).__name__}: {e}")
+        raise
+    store.finish_run(run_id, "succeeded")
@@ -0,0 +1,99 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Run independent tasks (one per release branch, one per target repo, ...)
+# on a bounded worker pool.
+#
+# Every task runs with its own log context, so log lines can be attributed to
+# the branch they are about, and a task raising does not stop the others.
+# Failures are collected and reported once all tasks are done.
+#
+
+
+import contextvars
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+TaskResult = namedtuple("TaskResult", ["name", "result", "error"])
+
+# Returned by a task that was postponed to a later run, for example because
+# the GitHub rate limit could not cover it
+DEFERRED = "deferred"
+
+current_task = contextvars.ContextVar("current_task", default=None)
+
+
+class TaskContextFilter(logging.Filter):
+    """Adds the name of the running task to log records as %(context)s."""
+
+    def filter(self, record):
+        task = current_task.get()
+        record.context = f"[{task}] " if task else ""
+        return True
+
+
+@contextmanager
+def task_context(name):
+    """Attribute log lines emitted in this block to the task name. Nested
+    contexts are joined, like main/update-as."""
+    parent = current_task.get()
+    token = current_task.set(f"{parent}/{name}" if parent else name)
+    try:
+        yield
+    finally:
+        current_task.reset(token)
+
+
+def default_max_workers():
+    return int(os.getenv("RELBOT_MAX_WORKERS") or DEFAULT_MAX_WORKERS)
+
+
+def _run_task(name, fn):
+    with task_context(name):
+        try:
+            return TaskResult(name, fn(), None)
+        except Exception as e:
+            log.exception(f"Task {name} failed")
+            return TaskResult(name, None, e)
+
+
+def run_tasks(tasks, max_workers=None):
+    """Run tasks, a list of (name, callable) pairs, with at most max_workers
+    at a time. Returns a TaskResult per task, in the order given."""
+    if max_workers is None:
+        max_workers = default_max_workers()
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [_run_task(name, fn) for name, fn in tasks]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = [
+            # Each task gets a copy of the caller's context, so an outer task
+            # context carries over into the worker thread.
+            executor.submit(contextvars.copy_context().run, _run_task, name, fn)
+            for name, fn in tasks
+        ]
+        return [future.result() for future in futures]
+
+
+def raise_for_failures(results):
+    """Log the outcome of every task and raise if any of them failed. Deferred
+    tasks are not failures."""
+    failures = [r for r in results if r.error is not None]
+    for r in results:
+        if r.result is DEFERRED:
+            log.warning(f"Task {r.name} was deferred to a later run")
+        elif r.error is None:
+            log.info(f"Task {r.name} succeeded")
+        else:
+            log.error(f"Task {r.name} failed: {r.error}")
+    if failures:
+        names = ", ".join(r.name for r in failures)
+        raise Exception(f"{len(failures)} of {len(results)} task(s) failed: {names}")
@@ -0,0 +1,35 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import threading
+
+import pytest
+
+import android_components
+import standins
+
+
+def test_update_main_runs_tasks_concurrently(monkeypatch):
+    # Both tasks must be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    ran = []
+
+    def update_as(ac_repo, branch_name, ac_major_version, author, dry_run):
+        barrier.wait()
+        ran.append("update-as")
+
+    def update_geckoview(ac_repo, branch_name, ac_major_version, author, dry_run):
+        barrier.wait()
+        raise Exception("Boom")
+
+    monkeypatch.setattr(android_components, "_update_application_services", update_as)
+    monkeypatch.setattr(android_components, "_update_geckoview", update_geckoview)
+    with standins.running(outdated=False) as env:
+        with pytest.raises(Exception, match="1 of 2 task"):
+            android_components.update_main(
+                env.firefox_repo, env.author, dry_run=False, max_workers=2
+            )
+    # The failing task did not stop the other one
+    assert ran == ["update-as"]
@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import sys
+
+import pytest
+
+import batch
+from relbot import batch_usage_error, main, usage_error
+
+
+def test_parse_commands(tmp_path):
+    assert batch.parse_commands(
+        [
+            "android-components update-main",
+            "reference-browser update-android-components",
+        ]
+    ) == [
+        ["android-components", "update-main"],
+        ["reference-browser", "update-android-components"],
+    ]
+    path = tmp_path / "commands.txt"
+    path.write_text(
+        "# Nightly\n"
+        "android-components update-main\n"
+        "\n"
+        "android-components update-releases  # Beta and Release\n"
+    )
+    assert batch.parse_commands(["--file", str(path)]) == [
+        ["android-components", "update-main"],
+        ["android-components", "update-releases"],
+    ]
+
+
+def test_usage_error_checks_every_command():
+    argv = ["relbot", "batch", "--file", "commands.txt"]
+    assert batch_usage_error(argv, [["android-components", "update-main"]]) is None
+    assert batch_usage_error(
+        argv, [["android-components", "update-main"], ["fenix", "update"]]
+    ).startswith("usage: relbot <android-components")
+    assert batch_usage_error(argv, [["serve"]]) == "relbot serve cannot run in a batch"
+    assert batch_usage_error(argv, []).startswith("usage: relbot batch")
+    assert usage_error(["relbot", "batch"]).startswith("usage: relbot batch")
+
+
+def test_commands_are_read_once_and_checked_before_running(
+    tmp_path, monkeypatch, capsys
+):
+    parsed = []
+    parse_commands = batch.parse_commands
+    monkeypatch.setattr(
+        batch,
+        "parse_commands",
+        lambda args: parsed.append(args) or parse_commands(args),
+    )
+    monkeypatch.setattr(batch, "run_batch", lambda commands, run: pytest.fail("Ran"))
+    path = tmp_path / "commands.txt"
+    path.write_text("android-components update-main\nfenix update\n")
+    argv = ["relbot", "batch", "--file", str(path)]
+    assert usage_error(argv) is None
+    with pytest.raises(SystemExit):
+        main(argv, None, None, None)
+    assert capsys.readouterr().out.startswith("usage: relbot <android-components")
+    assert parsed == [argv[2:]]
+
+    with pytest.raises(SystemExit):
+        main(["relbot", "batch", "--file", "/nope"], None, None, None)
+    assert "No such file" in capsys.readouterr().out
+
+
+def test_run_batch_reports_every_command():
+    ran = []
+
+    def run(command):
+        ran.append(command)
+        if command[1] == "update-releases":
+            raise Exception("Boom")
+        if command[1] == "update-android-components":
+            sys.exit(2)
+
+    results = batch.run_batch(
+        [
+            ["android-components", "update-releases"],
+            ["android-components", "update-main"],
+            ["reference-browser", "update-android-components"],
+        ],
+        run,
+    )
+    assert len(ran) == 3
+    assert [(result.command, result.status) for result in results] == [
+        ("android-components update-releases", 1),
+        ("android-components update-main", 0),
+        ("reference-browser update-android-components", 2),
+    ]
+    assert batch.exit_status(results) == 1
+    assert batch.exit_status(results[1:2]) == 0
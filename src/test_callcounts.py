@@ -0,0 +1,85 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+
+import android_components
+import callcounts
+import standins
+import util
+from http_session import RequestEvent
+
+COMMANDS = {
+    "update-main": lambda env: android_components.update_main(
+        env.firefox_repo, env.author, dry_run=False
+    ),
+    "update-releases": lambda env: android_components.update_releases(
+        env.firefox_repo, env.author, dry_run=False
+    ),
+    "update-android-components-nightly": lambda env: (
+        util.update_android_components_nightly(
+            env.firefox_repo, env.rb_repo, "", env.author, False, "master", False
+        )
+    ),
+}
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+@pytest.mark.parametrize("outdated", [False, True], ids=["no-op", "update"])
+def test_calls_within_budget(command, outdated):
+    name = command if outdated else f"{command} no-op"
+    with standins.running(outdated=outdated, release_branches=(125, 126)) as env:
+        with callcounts.counting() as counter:
+            COMMANDS[command](env)
+        # The stand-ins saw exactly what was counted
+        assert sum(counter.calls.values()) == sum(env.github.calls.values()) + sum(
+            env.maven.calls.values()
+        )
+    assert counter.over_budget(name) == []
+
+
+def test_endpoint_class():
+    repo = "https://api.github.com/repos/mozilla-mobile/firefox-android"
+    assert callcounts.endpoint_class("github", "GET", repo) == "GET repos"
+    assert (
+        callcounts.endpoint_class("github", "GET", f"{repo}/contents/version.txt")
+        == "GET contents"
+    )
+    assert (
+        callcounts.endpoint_class("github", "GET", f"{repo}/git/refs/heads/main")
+        == "GET git/refs"
+    )
+    assert (
+        callcounts.endpoint_class("github", "POST", f"{repo}/issues/12/comments")
+        == "POST issues/comments"
+    )
+    assert (
+        callcounts.endpoint_class(
+            "github", "POST", "https://ghe.example.com/api/graphql"
+        )
+        == "POST graphql"
+    )
+    assert (
+        callcounts.endpoint_class(
+            "maven", "GET", "https://maven.mozilla.org/maven2/a/b/1.0/b-1.0.pom"
+        )
+        == "GET pom"
+    )
+
+
+def github_event(method, url):
+    return RequestEvent("github", method, url, 200, 0, 0.0, 0, {})
+
+
+def test_over_budget():
+    counter = callcounts.CallCounter()
+    for _ in range(3):
+        counter.observe(
+            github_event("GET", "https://api.github.com/repos/o/n/branches/b")
+        )
+    assert counter.over_budget("update-android-components-nightly no-op") == [
+        "update-android-components-nightly no-op: github reads 3 > 2 "
+        "({'github GET branches': 3})"
+    ]
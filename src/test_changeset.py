@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+
+import snapshot
+from android_components import _update_glean_version, _update_gv_version
+from changeset import ChangeSet
+from fakes import FakeRepo
+from test_util import GECKO_KT
+from util import get_dependencies_file_path, get_gecko_file_path
+
+DEPENDENCIES_PLUGIN_KT = """
+object Versions {
+    const val mozilla_glean = "51.8.0"
+}
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_snapshot():
+    snapshot.clear()
+    yield
+    snapshot.clear()
+
+
+def fake_repo():
+    return FakeRepo(
+        {
+            get_gecko_file_path(126): GECKO_KT,
+            get_dependencies_file_path(126): DEPENDENCIES_PLUGIN_KT,
+        }
+    )
+
+
+def test_all_changes_are_written_in_one_commit():
+    repo = fake_repo()
+    changes = ChangeSet(repo, "main")
+    _update_gv_version(
+        changes, "90.0.20210420095122", "91.0.20210520095122", "nightly", 126
+    )
+    _update_glean_version(changes, "51.8.0", "52.0.0", 126)
+    repo.calls.clear()
+    assert changes.create_branch("relbot/upgrade-geckoview-ac-main", None) == "b" * 40
+
+    assert [call[0] for call in repo.calls] == [
+        "get_git_commit",
+        "create_git_tree",
+        "create_git_commit",
+        "create_git_ref",
+    ]
+    tree = repo.calls[1][1]
+    assert [element["path"] for element in tree] == [
+        get_gecko_file_path(126),
+        get_dependencies_file_path(126),
+    ]
+    assert 'const val version = "91.0.20210520095122"' in tree[0]["content"]
+    assert 'mozilla_glean = "52.0.0"' in tree[1]["content"]
+    assert repo.calls[2][1] == (
+        "Update GeckoView (Nightly) to 91.0.20210520095122. Update Glean to 52.0.0."
+    )
+    assert repo.calls[3] == (
+        "create_git_ref",
+        "refs/heads/relbot/upgrade-geckoview-ac-main",
+        "b" * 40,
+    )
+    assert snapshot.get_head_sha(repo, "relbot/upgrade-geckoview-ac-main") == "b" * 40
+
+
+def test_no_branch_without_changes():
+    repo = fake_repo()
+    with pytest.raises(Exception):
+        ChangeSet(repo, "main").create_branch("relbot/nothing", None)
+    # Only the branch head was read, nothing was written
+    assert repo.calls == [("get_git_ref", "heads/main")]
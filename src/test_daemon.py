@@ -0,0 +1,70 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import daemon
+import http_session
+import snapshot
+from daemon import Job
+
+
+@pytest.fixture(autouse=True)
+def no_http_cache():
+    previous = http_session.get_cache()
+    http_session.set_cache(None)
+    yield
+    http_session.set_cache(previous)
+
+
+def test_jobs_run_on_their_schedule_and_failures_do_not_stop_serving():
+    stop = threading.Event()
+    repo = SimpleNamespace(
+        full_name="mozilla-mobile/firefox-android",
+        get_git_ref=lambda ref: SimpleNamespace(object=SimpleNamespace(sha="b" * 40)),
+    )
+    ran = []
+    seen = []
+    caches = set()
+
+    def run(argv):
+        ran.append(argv[0])
+        caches.add(http_session.get_cache())
+        seen.append(snapshot.get_head_sha(repo, "main"))
+        snapshot.set_head_sha(repo, "main", "a" * 40)
+        if len(ran) == 6:
+            stop.set()
+        if argv[0] == "fails":
+            raise Exception("Boom")
+
+    daemon.serve(
+        run,
+        stop,
+        jobs=[Job("often", ("often",), 0.01), Job("fails", ("fails",), 0.05)],
+    )
+    assert ran[:2] == ["often", "fails"]
+    assert ran.count("often") > ran.count("fails")
+    # What a run learns about branches does not outlive it
+    assert seen == ["b" * 40] * len(ran)
+    # Serving without RELBOT_CACHE_DIR still keeps upstream metadata cached,
+    # in a directory that is removed when serving stops
+    (cache,) = caches
+    assert cache is not None
+    assert http_session.get_cache() is None
+    assert not os.path.exists(cache.directory)
+
+
+def test_jobs_from_env(monkeypatch):
+    monkeypatch.setenv("RELBOT_SERVE_UPDATE_MAIN", "60")
+    jobs = {job.name: job.interval for job in daemon.jobs_from_env()}
+    assert jobs == {
+        "update-main": 60,
+        "update-releases": 1800,
+        "update-reference-browser": 3600,
+    }
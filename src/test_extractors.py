@@ -0,0 +1,69 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+
+from extractors import extract, extract_field, scan
+from test_util import ANDROID_COMPONENTS_KT, GECKO_KT
+
+APPLICATION_SERVICES_KT = """
+object ApplicationServicesConfig {
+    val VERSION = "{version}"
+    val CHANNEL = ApplicationServicesChannel.{channel}
+}
+"""
+
+DEPENDENCIES_PLUGIN_KT = """
+object Versions {
+    const val mozilla_appservices = "97.2.0"
+    const val mozilla_glean = "51.8.2"
+}
+"""
+
+
+def app_services_kt(version, channel):
+    return APPLICATION_SERVICES_KT.replace("{version}", version).replace(
+        "{channel}", channel
+    )
+
+
+def test_extract_all_fields():
+    assert extract("gecko", GECKO_KT) == {
+        "gv_version": "90.0.20210420095122",
+        "gv_channel": "nightly",
+    }
+    assert extract("dependencies", DEPENDENCIES_PLUGIN_KT) == {
+        "as_version": "97.2.0",
+        "glean_version": "51.8.2",
+    }
+    assert extract("app_services", app_services_kt("126.0", "NIGHTLY")) == {
+        "as_version": "126.0",
+        "as_channel": "nightly",
+    }
+    assert extract("android_components", ANDROID_COMPONENTS_KT) == {
+        "ac_version": "64.0.20201027143116"
+    }
+
+
+def test_extract_validates():
+    with pytest.raises(Exception):
+        extract("app_services", app_services_kt("126.0", "STAGING"))
+    with pytest.raises(Exception):
+        extract("gecko", GECKO_KT.replace("90.0.20210420095122", "90.0"))
+
+
+def test_extract_field_only_validates_that_field():
+    src = app_services_kt("126.0", "STAGING")
+    assert extract_field("app_services", src, "as_version") == "126.0"
+    with pytest.raises(Exception):
+        extract_field("app_services", src, "as_channel")
+    assert extract_field("gecko", "object Gecko {}", "gv_version") is None
+
+
+def test_scan_is_memoized():
+    scan.cache_clear()
+    extract_field("gecko", GECKO_KT, "gv_version")
+    extract_field("gecko", GECKO_KT, "gv_channel")
+    assert scan.cache_info().misses == 1
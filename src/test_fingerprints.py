@@ -0,0 +1,72 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+from types import SimpleNamespace
+
+import pytest
+
+import android_components
+import daemon
+import fingerprints
+import standins
+from fingerprints import FingerprintStore
+from state import StateStore
+
+REPO = SimpleNamespace(full_name="mozilla-mobile/firefox-android")
+
+
+def test_store_is_persisted(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    store = FingerprintStore(StateStore(path))
+    store.record(REPO, "main", "update-geckoview", "a" * 40, "nightly", "etag1")
+
+    store = FingerprintStore(StateStore(path))
+    upstream = {"nightly": "etag1"}
+    assert store.unchanged(REPO, "main", "update-geckoview", "a" * 40, upstream.get)
+    assert not store.unchanged(REPO, "main", "update-geckoview", "b" * 40, upstream.get)
+    assert not store.unchanged(REPO, "main", "update-as", "a" * 40, upstream.get)
+    upstream["nightly"] = "etag2"
+    assert not store.unchanged(REPO, "main", "update-geckoview", "a" * 40, upstream.get)
+    assert store.stats() == {"hits": 1, "misses": 3}
+
+    store.forget(REPO, "main", "update-geckoview")
+    assert (
+        StateStore(path).get_fingerprint(REPO.full_name, "main", "update-geckoview")
+        is None
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    yield fingerprints.install(FingerprintStore(StateStore(str(tmp_path / "s.sqlite"))))
+    fingerprints.uninstall()
+
+
+def test_no_op_runs_are_short_circuited(store):
+    with standins.running(outdated=False) as env:
+        android_components.update_releases(env.firefox_repo, env.author, False)
+        daemon.clear_run_caches()
+        env.reset_counts()
+
+        android_components.update_releases(env.firefox_repo, env.author, False)
+        # Only the GV metadata of both channels was checked, no artifacts,
+        # and no branch was read beyond the listing of its head
+        assert env.maven.calls == {"GET maven-metadata.xml": 4}
+        assert "POST graphql" not in env.github.calls
+        assert store.stats() == {"hits": 2, "misses": 2}
+
+        # A new Beta changes the metadata, and is picked up
+        daemon.clear_run_caches()
+        standins.publish_gv(
+            env.maven,
+            "beta",
+            [f"126.0.2024030{patch}185343" for patch in range(1, 5)],
+            "60.0.0",
+        )
+        android_components.update_releases(env.firefox_repo, env.author, False)
+        firefox = env.github.repos["mozilla-mobile/firefox-android"]
+        assert [pull["head"] for pull in firefox.pulls] == [
+            "relbot/upgrade-geckoview-ac-126"
+        ]
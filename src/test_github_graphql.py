@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+from types import SimpleNamespace
+
+import pytest
+
+import github_graphql
+import snapshot
+import standins
+from test_util import GECKO_KT
+from util import get_current_gv_version, get_dependency_file_paths, get_gecko_file_path
+
+
+@pytest.fixture
+def github(monkeypatch):
+    with standins.GitHubStandIn() as github:
+        monkeypatch.setenv("RELBOT_GITHUB_GRAPHQL_URL", f"{github.url}/graphql")
+        snapshot.clear()
+        yield github
+        snapshot.clear()
+
+
+class NoRestRepo:
+    full_name = "mozilla-mobile/firefox-android"
+    url = "https://api.github.com/repos/mozilla-mobile/firefox-android"
+
+    def __getattr__(self, name):
+        raise AssertionError(f"Unexpected REST call {name}")
+
+
+def test_read_branch_states_batches_branches(github):
+    gecko_path = get_gecko_file_path(None)
+    firefox = github.add_repo("mozilla-mobile/firefox-android")
+    firefox.commit("releases_v125", {gecko_path: GECKO_KT})
+    firefox.commit("releases_v126", {"version.txt": "126.0\n"})
+
+    states = github_graphql.read_branch_states(
+        NoRestRepo(),
+        ["releases_v125", "releases_v126", "releases_v127"],
+        get_dependency_file_paths(None),
+    )
+
+    assert github.calls == {"POST graphql": 1}
+    assert states["releases_v125"]["sha"] == firefox.branches["releases_v125"]
+    [(path, (_, text))] = states["releases_v125"]["files"].items()
+    assert (path, text) == (gecko_path, GECKO_KT)
+    [(path, (_, text))] = states["releases_v126"]["files"].items()
+    assert (path, text) == ("version.txt", "126.0\n")
+    assert states["releases_v127"] is None
+
+
+def test_prefetch_feeds_snapshot_readers(github):
+    firefox = github.add_repo("mozilla-mobile/firefox-android")
+    sha = firefox.commit("main", {get_gecko_file_path(None): GECKO_KT})
+    repo = NoRestRepo()
+    github_graphql.prefetch_branches(repo, ["main"], get_dependency_file_paths(None))
+    assert get_current_gv_version(repo, "main", 126) == "90.0.20210420095122"
+    assert snapshot.get_head_sha(repo, "main") == sha
+
+
+def test_truncated_files_are_left_to_rest(github, monkeypatch):
+    monkeypatch.setattr(github, "GRAPHQL_MAX_TEXT", 10)
+    firefox = github.add_repo("mozilla-mobile/firefox-android")
+    firefox.commit(
+        "main", {"version.txt": "126.0\n", get_gecko_file_path(None): GECKO_KT}
+    )
+    state = github_graphql.read_branch_state(
+        NoRestRepo(), "main", get_dependency_file_paths(None)
+    )
+    assert list(state["files"]) == ["version.txt"]
+
+
+def test_graphql_url():
+    repo = SimpleNamespace(url="https://ghe.example.com/api/v3/repos/o/n")
+    assert github_graphql.graphql_url(repo) == "https://ghe.example.com/api/graphql"
+    repo = SimpleNamespace(url="https://api.github.com/repos/o/n")
+    assert github_graphql.graphql_url(repo) == "https://api.github.com/graphql"
+    repo = SimpleNamespace(url="/repos/o/n")
+    assert github_graphql.graphql_url(repo) == "https://api.github.com/graphql"
@@ -0,0 +1,74 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import os
+
+import pytest
+
+import http_session
+import standins
+from http_cache import HttpCache
+
+
+@pytest.fixture
+def server():
+    with standins.MavenStandIn() as server:
+        yield server
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "http"))
+    previous = http_session.set_cache(cache)
+    yield cache
+    http_session.set_cache(previous)
+
+
+def test_revalidated_response_is_served_from_disk(server, cache):
+    url = f"{server.url}/nightly.json"
+    server.files["/nightly.json"] = '{"version": "114.20230401050306"}'
+
+    r = http_session.get(url)
+    assert r.json() == {"version": "114.20230401050306"}
+    assert cache.stats()["misses"] == 1
+
+    r = http_session.get(url)
+    r.raise_for_status()
+    assert r.json() == {"version": "114.20230401050306"}
+    assert r.from_cache
+    assert server.not_modified == 1
+    assert cache.stats()["hits"] == 1
+
+    # A new publish changes the validator and is downloaded in full
+    server.files["/nightly.json"] = '{"version": "114.20230402050306"}'
+    assert http_session.get(url).json() == {"version": "114.20230402050306"}
+    assert cache.stats() == {"hits": 1, "misses": 2, "bytes_saved": 33}
+
+
+def test_entry_evicted_while_revalidating_is_still_served(server, cache, monkeypatch):
+    url = f"{server.url}/nightly.json"
+    server.files["/nightly.json"] = '{"version": "114.20230401050306"}'
+    http_session.get(url)
+
+    load = cache._load
+
+    def load_then_evict(url):
+        loaded = load(url)
+        for path in cache._paths(url):
+            os.remove(path)
+        return loaded
+
+    monkeypatch.setattr(cache, "_load", load_then_evict)
+    assert http_session.get(url).from_cache
+
+
+def test_cache_is_size_bounded(server, tmp_path):
+    cache = HttpCache(str(tmp_path / "http"), max_bytes=400)
+    session = http_session.create_session(retries=0)
+    for i in range(10):
+        server.files[f"/{i}"] = str(i) * 100
+        cache.get(session, f"{server.url}/{i}")
+    size = sum(p.stat().st_size for p in (tmp_path / "http").iterdir())
+    assert size <= 400
@@ -0,0 +1,71 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+import requests
+
+import http_session
+import standins
+import util
+
+
+def test_get_latest_gv_version_reuses_connection(maven, monkeypatch):
+    monkeypatch.setattr(util, "MAVEN", f"{maven.url}/maven2")
+    versions = ["92.0.20210922161155", "93.0.20210923190449"]
+    maven.files["/maven2/org/mozilla/geckoview/geckoview-omni/maven-metadata.xml"] = (
+        standins.maven_metadata(versions)
+    )
+    maven.files["/maven2/org/mozilla/geckoview/geckoview/maven-metadata.xml"] = (
+        standins.maven_metadata(versions)
+    )
+    standins.publish_gv_poms(maven, "92.0.20210922161155")
+
+    assert (
+        util.get_latest_gv_version(92, "release", concurrent=False)
+        == "92.0.20210922161155"
+    )
+    assert sum(maven.calls.values()) == 6
+    # All requests went over a single kept-alive connection
+    assert len(maven.clients) == 1
+
+
+def test_set_session_returns_previous():
+    session = http_session.create_session()
+    previous = http_session.set_session(session)
+    try:
+        assert http_session.get_session() is session
+    finally:
+        http_session.set_session(previous)
+
+
+def test_create_session_pool_size():
+    session = http_session.create_session(pool_connections=2, pool_maxsize=5)
+    adapter = session.get_adapter("https://maven.mozilla.org/")
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 5
+    assert "gzip" in session.headers["Accept-Encoding"]
+
+
+def test_get_latest_gv_version_concurrent(maven, monkeypatch):
+    monkeypatch.setattr(util, "MAVEN", f"{maven.url}/maven2")
+    versions = ["93.0.20210923190449", "93.0.20210930190449"]
+    maven.files[
+        "/maven2/org/mozilla/geckoview/geckoview-beta-omni/maven-metadata.xml"
+    ] = standins.maven_metadata(versions)
+    maven.files["/maven2/org/mozilla/geckoview/geckoview-beta/maven-metadata.xml"] = (
+        standins.maven_metadata(versions)
+    )
+    standins.publish_gv_poms(maven, "93.0.20210930190449", name="geckoview-beta-omni")
+
+    assert util.get_latest_gv_version(93, "beta") == "93.0.20210930190449"
+    assert sum(maven.calls.values()) == 6
+
+    # A missing architecture still fails the lookup
+    del maven.files[
+        "/maven2/org/mozilla/geckoview/geckoview-beta-omni-x86/93.0.20210930190449/"
+        "geckoview-beta-omni-x86-93.0.20210930190449.pom"
+    ]
+    with pytest.raises(requests.HTTPError):
+        util.get_latest_gv_version(93, "beta")
@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import threading
+import time
+
+from fakes import FakeClock
+from http_session import RequestEvent
+from ratelimit import RateLimitBudget, ScheduledTask, schedule
+from tasks import DEFERRED, raise_for_failures, run_tasks
+
+
+def github_event(method="GET", status=200, remaining=4000, reset=1060, **headers):
+    headers = {
+        "X-RateLimit-Limit": "5000",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+        "X-RateLimit-Used": str(5000 - remaining),
+        **headers,
+    }
+    return RequestEvent(
+        "github", method, "https://api.github.com/x", status, 0, 0, 0, headers
+    )
+
+
+def make_budget(**kwargs):
+    clock = FakeClock(1000.0)
+    budget = RateLimitBudget(clock=clock, sleep=clock.sleep, **kwargs)
+    return budget, clock
+
+
+def test_observe_tracks_rate_limit_headers():
+    budget, _ = make_budget()
+    assert budget.remaining() is None
+    budget.observe(github_event(remaining=4321))
+    budget.observe(github_event(method="POST", remaining=4320))
+    budget.observe(
+        github_event(method="POST", remaining=99, **{"X-RateLimit-Resource": "graphql"})
+    )
+    assert budget.remaining() == 4320
+    assert budget.remaining("graphql") == 99
+    report = budget.report()
+    assert (report["reads"], report["writes"]) == (1, 2)
+    assert report["remaining"] == {"core": "4320/5000", "graphql": "99/5000"}
+
+
+def test_writes_are_paced():
+    budget, clock = make_budget(write_interval=1.0)
+    budget.before_request("github", "POST", "https://api.github.com/x")
+    budget.before_request("github", "GET", "https://api.github.com/x")
+    budget.before_request("maven", "POST", "https://maven.example/x")
+    assert clock.now == 1000.0
+    clock.now += 0.25
+    budget.before_request("github", "POST", "https://api.github.com/x")
+    assert clock.now == 1001.0
+    assert budget.report()["waited"] == 0.8
+
+
+def test_graphql_queries_are_reads():
+    budget, clock = make_budget(write_interval=1.0)
+    budget.before_request("github", "POST", "https://api.github.com/graphql")
+    budget.before_request("github", "POST", "https://api.github.com/graphql")
+    assert clock.now == 1000.0
+    budget.observe(
+        github_event(method="POST")._replace(url="https://api.github.com/graphql")
+    )
+    assert (budget.report()["reads"], budget.report()["writes"]) == (1, 0)
+
+
+def test_low_budget_waits_for_a_close_reset():
+    budget, clock = make_budget(reserve=10, max_wait=120)
+    budget.observe(github_event(remaining=30, reset=1060))
+    assert budget.acquire("main/update-as", 15)
+    # 15 of the 30 calls are set aside, the reserve leaves 5 for this one
+    assert budget.acquire("main/update-geckoview", 30)
+    assert clock.now == 1060
+    assert budget.report()["deferred"] == []
+
+
+def test_low_budget_defers_when_reset_is_far():
+    budget, clock = make_budget(reserve=10, max_wait=120)
+    budget.observe(github_event(remaining=30, reset=4600))
+    assert not budget.acquire("releases_v126", 30)
+    assert clock.now == 1000.0
+    assert budget.report()["deferred"] == ["releases_v126"]
+
+
+def test_schedule_runs_by_priority_and_defers_what_does_not_fit():
+    budget, _ = make_budget(reserve=0, max_wait=0)
+    budget.observe(github_event(remaining=50, reset=4600))
+    ran = []
+    tasks = schedule(
+        [
+            ScheduledTask("releases_v125", lambda: ran.append(125), 2, 40),
+            ScheduledTask("main", lambda: ran.append("main"), 0, 10),
+            ScheduledTask("releases_v126", lambda: ran.append(126), 1, 30),
+        ],
+        budget,
+    )
+    assert [name for name, _ in tasks] == ["main", "releases_v126", "releases_v125"]
+    # Calls are set aside while a task runs and given back afterwards, so
+    # every task of a sequential run sees the whole budget.
+    results = run_tasks(tasks, max_workers=1)
+    assert ran == ["main", 126, 125]
+
+    budget.observe(github_event(remaining=35, reset=4600))
+    ran.clear()
+    results = run_tasks(tasks, max_workers=1)
+    assert ran == ["main", 126]
+    assert results[2].result is DEFERRED
+    # Deferred work does not fail the run
+    raise_for_failures(results)
+
+
+def test_budget_is_claimed_in_priority_order():
+    budget, _ = make_budget(reserve=0, max_wait=0)
+    budget.observe(github_event(remaining=40, reset=4600))
+    ran = []
+    results = {}
+
+    def run_main():
+        # Main is still running when the release branch claims its calls
+        release.join()
+        ran.append("main")
+
+    tasks = schedule(
+        [
+            ScheduledTask("releases_v126", lambda: ran.append(126), 1, 30),
+            ScheduledTask("main", run_main, 0, 30),
+        ],
+        budget,
+    )
+
+    def run(name, fn):
+        results[name] = fn()
+
+    # The release branch starts first, but has to wait for main to claim its
+    # calls, and what is left does not cover it
+    release = threading.Thread(target=run, args=tasks[1])
+    release.start()
+    time.sleep(0.1)
+    assert results == {}
+    main = threading.Thread(target=run, args=tasks[0])
+    main.start()
+    main.join()
+    assert ran == ["main"]
+    assert results["releases_v126"] is DEFERRED
@@ -0,0 +1,62 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import os
+import subprocess
+import sys
+
+from relbot import USAGE, LazyRepo, usage_error
+
+
+def test_usage_error():
+    assert usage_error(["relbot"]) == USAGE
+    assert usage_error(["relbot", "fenix"]) == USAGE
+    assert usage_error(["relbot", "android-components"]) == (
+        "usage: relbot android-components <update-main,update-releases>"
+    )
+    assert usage_error(["relbot", "reference-browser", "update-main"]) == (
+        "usage: relbot reference-browser <update-android-components>"
+    )
+    assert usage_error(["relbot", "android-components", "update-releases"]) is None
+    assert usage_error(["relbot", "serve"]) is None
+
+
+def test_argument_errors_do_not_import_github():
+    script = os.path.join(os.path.dirname(__file__), "relbot.py")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", script, "android-components"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert result.stdout.startswith("usage: relbot android-components")
+    imported = [line.split("|")[-1].strip() for line in result.stderr.splitlines()]
+    assert "github" not in imported
+    assert "util" not in imported
+
+
+class FakeGithub:
+    def __init__(self):
+        self.calls = []
+
+    def get_repo(self, full_name, lazy=False):
+        self.calls.append((full_name, lazy))
+        return FakeRepository()
+
+
+class FakeRepository:
+    def get_branch(self, name):
+        return name
+
+
+def test_lazy_repo():
+    github = FakeGithub()
+    repo = LazyRepo(github, "mozilla-mobile/firefox-android")
+    assert repo.full_name == "mozilla-mobile/firefox-android"
+    assert f"{repo}" == "mozilla-mobile/firefox-android"
+    assert github.calls == []
+    assert repo.get_branch("main") == "main"
+    assert repo.get_branch("releases_v126") == "releases_v126"
+    assert github.calls == [("mozilla-mobile/firefox-android", True)]
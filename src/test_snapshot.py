@@ -0,0 +1,57 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import pytest
+from github import GithubException
+
+import snapshot
+from fakes import FakeRepo
+from test_util import GECKO_KT
+from util import (
+    get_current_gv_channel,
+    get_current_gv_version,
+    get_gecko_file_path,
+    pr_branch_exists,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_snapshot():
+    snapshot.clear()
+    yield
+    snapshot.clear()
+
+
+def test_readers_share_one_fetch_per_file():
+    repo = FakeRepo({get_gecko_file_path(126): GECKO_KT})
+    assert get_current_gv_channel(repo, "main", 126) == "nightly"
+    assert get_current_gv_version(repo, "main", 126) == "90.0.20210420095122"
+    assert repo.calls == [
+        ("get_git_ref", "heads/main"),
+        ("get_contents", get_gecko_file_path(126), "a" * 40),
+    ]
+
+
+def test_pr_branches_are_listed_once():
+    repo = FakeRepo({})
+    repo.heads["relbot/update-as/ac-main"] = "c" * 40
+    assert pr_branch_exists(repo, "relbot/update-as/ac-main")
+    assert not pr_branch_exists(repo, "relbot/upgrade-geckoview-ac-main")
+    # A branch created during the run is found without listing again
+    snapshot.set_head_sha(repo, "relbot/upgrade-geckoview-ac-main", "d" * 40)
+    assert pr_branch_exists(repo, "relbot/upgrade-geckoview-ac-main")
+    assert repo.calls == [("get_git_matching_refs", "heads/relbot/")]
+    assert snapshot.get_head_sha(repo, "relbot/update-as/ac-main") == "c" * 40
+
+
+def test_pr_branch_listing_errors_are_raised():
+    repo = FakeRepo({})
+
+    def get_git_matching_refs(ref):
+        raise GithubException(502, {"message": "Server Error"}, None)
+
+    repo.get_git_matching_refs = get_git_matching_refs
+    with pytest.raises(GithubException):
+        pr_branch_exists(repo, "relbot/update-as/ac-main")
@@ -0,0 +1,76 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import android_components
+import standins
+import util
+
+
+def test_update_main_end_to_end():
+    with standins.running() as env:
+        android_components.update_main(env.firefox_repo, env.author, dry_run=False)
+        firefox = env.github.repos["mozilla-mobile/firefox-android"]
+        assert sorted(pull["head"] for pull in firefox.pulls) == [
+            "relbot/update-as/ac-127",
+            "relbot/upgrade-geckoview-ac-main",
+        ]
+        gecko_kt = firefox.commits[
+            firefox.branches["relbot/upgrade-geckoview-ac-main"]
+        ]["files"][util.get_gecko_file_path(127)]
+        assert 'version = "127.0.20240403094500"' in gecko_kt
+        # A-S and GeckoView are updated concurrently, so either PR may be #1.
+        [as_number] = [
+            number
+            for number, pull in enumerate(firefox.pulls, start=1)
+            if pull["head"] == "relbot/update-as/ac-127"
+        ]
+        assert firefox.comments == [(as_number, "bors try")]
+
+
+def test_update_android_components_nightly_end_to_end():
+    with standins.running(outdated=False) as env:
+        util.update_android_components_nightly(
+            env.firefox_repo, env.rb_repo, "", env.author, False, "master", False
+        )
+        assert env.github.repos["mozilla-mobile/reference-browser"].pulls == []
+        assert env.maven.calls == {"GET maven-metadata.xml": 1}
+
+
+def test_update_android_components_nightly_targets():
+    with standins.running() as env:
+        rb = env.github.repos["mozilla-mobile/reference-browser"]
+        fork = env.github.add_repo("st3fan/reference-browser")
+        fork.commit("main", {"app/buildSrc/src/main/java/AndroidComponents.kt": ""})
+        staging = env.github.add_repo("mozilla-releng/staging-reference-browser")
+        staging.commit("master", rb.commits[rb.branches["master"]]["files"])
+        env.reset_counts()
+
+        results = util.update_android_components_nightly_targets(
+            env.firefox_repo,
+            [
+                util.NightlyTarget(env.rb_repo, "", "master"),
+                util.NightlyTarget(
+                    env.repo("st3fan/reference-browser"), "app/", "main"
+                ),
+                util.NightlyTarget(
+                    env.repo("mozilla-releng/staging-reference-browser"), "", "master"
+                ),
+            ],
+            env.author,
+            debug=False,
+            dry_run=False,
+        )
+
+        # The latest nightly was looked up once for all targets
+        assert env.maven.calls == {"GET maven-metadata.xml": 1}
+        assert results[0].result == (
+            "https://github.com/mozilla-mobile/reference-browser/pull/1"
+        )
+        # A target failing does not stop the others
+        assert "Could not match the VERSION" in str(results[1].error)
+        assert results[2].result == (
+            "https://github.com/mozilla-releng/staging-reference-browser/pull/1"
+        )
+        assert staging.pulls[0]["head"] == "relbot/AC-Nightly-127.0.20240403090000"
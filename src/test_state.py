@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import android_components
+import daemon
+import standins
+import state
+from state import StateStore
+
+
+def test_schema_is_migrated_once(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    store = StateStore(path)
+    assert store.schema_version() == len(state.MIGRATIONS)
+    store.set_fact("glean", "geckoview-omni:126.0", "60.0.0")
+    store.close()
+
+    # Opening it again keeps what was stored
+    store = StateStore(path)
+    assert store.get_fact("glean", "geckoview-omni:126.0") == "60.0.0"
+    store.close()
+
+    db = sqlite3.connect(path)
+    db.execute(f"PRAGMA user_version = {len(state.MIGRATIONS) + 1}")
+    db.close()
+    with pytest.raises(Exception, match="newer than this relbot knows"):
+        StateStore(path)
+
+
+def test_run_history():
+    state.install(StateStore())
+    try:
+        with state.recording("android-components update-main"):
+            pass
+        with pytest.raises(ValueError):
+            with state.recording("android-components update-releases"):
+                raise ValueError("Boom")
+        runs = state.get_state().get_runs()
+    finally:
+        state.uninstall()
+    assert [(run.command, run.status, run.error) for run in runs] == [
+        ("android-components update-releases", "failed", "ValueError: Boom"),
+        ("android-components update-main", "succeeded", None),
+    ]
+    assert all(run.finished_at >= run.started_at for run in runs)
+
+
+def test_run_history_is_bounded(monkeypatch):
+    monkeypatch.setattr(state, "KEEP_RUNS", 3)
+    store = StateStore()
+    for i in range(5):
+        store.finish_run(store.start_run(f"run {i}"), "succeeded")
+    assert [run.command for run in store.get_runs()] == ["run 4", "run 3", "run 2"]
+
+
+def test_concurrent_workers(tmp_path):
+    store = StateStore(str(tmp_path / "state.sqlite"))
+
+    def work(i):
+        store.set_fact("glean", f"geckoview-omni:{i}", f"{i}.0.0")
+        return store.get_fact("glean", f"geckoview-omni:{i}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(work, range(100))) == [f"{i}.0.0" for i in range(100)]
+
+
+def test_upstream_facts_are_looked_up_once():
+    store = state.install(StateStore())
+    try:
+        with standins.running() as env:
+            android_components.update_releases(env.firefox_repo, env.author, False)
+            daemon.clear_run_caches()
+            env.reset_counts()
+
+            android_components.update_releases(env.firefox_repo, env.author, False)
+            # The Glean versions and uploads of both releases are known
+            assert env.maven.calls == {"GET maven-metadata.xml": 4}
+            glean = store.get_fact("glean", "geckoview-beta-omni:126.0.20240303185343")
+            assert glean == "60.0.0"
+    finally:
+        state.uninstall()
@@ -0,0 +1,42 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import threading
+
+import pytest
+
+from tasks import current_task, raise_for_failures, run_tasks, task_context
+
+
+def test_run_tasks_isolates_failures():
+    def fail():
+        raise Exception("boom")
+
+    results = run_tasks(
+        [("releases_v125", lambda: 125), ("releases_v126", fail), ("main", lambda: 1)],
+        max_workers=3,
+    )
+    assert [r.name for r in results] == ["releases_v125", "releases_v126", "main"]
+    assert results[0].result == 125 and results[0].error is None
+    assert str(results[1].error) == "boom"
+    assert results[2].result == 1
+
+    with pytest.raises(Exception, match="1 of 3 task"):
+        raise_for_failures(results)
+
+
+def test_run_tasks_runs_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+    results = run_tasks([("a", barrier.wait), ("b", barrier.wait)], max_workers=2)
+    assert all(r.error is None for r in results)
+
+
+def test_tasks_have_their_own_log_context():
+    with task_context("update-main"):
+        results = run_tasks(
+            [("as", current_task.get), ("gv", current_task.get)], max_workers=2
+        )
+    assert [r.result for r in results] == ["update-main/as", "update-main/gv"]
+    assert current_task.get() is None
@@ -0,0 +1,82 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import json
+
+import pytest
+
+import tracing
+import util
+from standins import maven_metadata, publish_gv_poms
+from tasks import task_context
+
+
+@pytest.fixture
+def tracer():
+    yield tracing.install()
+    tracing.uninstall()
+
+
+def test_requests_are_nested_under_operation_and_task(
+    maven, tracer, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(util, "MAVEN", f"{maven.url}/maven2")
+    versions = ["93.0.20210923190449", "93.0.20210930190449"]
+    maven.files[
+        "/maven2/org/mozilla/geckoview/geckoview-beta-omni/maven-metadata.xml"
+    ] = maven_metadata(versions)
+    maven.files["/maven2/org/mozilla/geckoview/geckoview-beta/maven-metadata.xml"] = (
+        maven_metadata(versions)
+    )
+    publish_gv_poms(maven, "93.0.20210930190449", name="geckoview-beta-omni")
+
+    with task_context("releases_v93"):
+        assert util.get_latest_gv_version(93, "beta") == "93.0.20210930190449"
+
+    operations = {
+        span["name"]: span for span in tracer.spans if span["kind"] == "operation"
+    }
+    assert set(operations) == {"get_latest_gv_version", "get_gv_catalog"}
+    assert (
+        operations["get_gv_catalog"]["parent"]
+        == operations["get_latest_gv_version"]["id"]
+    )
+    requests = [span for span in tracer.spans if span["kind"] == "request"]
+    assert len(requests) == 6
+    for span in requests:
+        # Also for the requests made in parallel on other threads
+        assert span["task"] == "releases_v93"
+        assert span["parent"] in (
+            operations["get_latest_gv_version"]["id"],
+            operations["get_gv_catalog"]["id"],
+        )
+        assert span["name"] == "maven GET"
+        assert span["status"] == 200
+        assert span["bytes"] > 0
+
+    path = tmp_path / "trace.json"
+    tracer.write(path)
+    trace = json.loads(path.read_text())
+    assert len(trace["spans"]) == 8
+    assert trace["dropped"] == 0
+    summary = tracer.summary(3)
+    assert len(summary.splitlines()) == 4
+    assert "[releases_v93] maven GET" in summary
+
+
+def test_failed_operations_are_recorded(tracer):
+    @tracing.traced
+    def fails():
+        raise Exception("Boom")
+
+    with pytest.raises(Exception):
+        fails()
+    assert tracer.spans[0]["status"] == "error"
+    assert tracer.spans[0]["name"].endswith("fails")
+
+
+def test_traced_without_tracer():
+    assert tracing.get_tracer() is None
+    assert tracing.traced(lambda: 42)() == 42
@@ -4,13 +4,18 @@
 
 
 import os
+from types import SimpleNamespace
 
 import github
 import pytest
 
+import snapshot
+import util
 from util import (
+    GeckoViewCatalog,
     ac_version_from_tag,
     compare_gv_versions,
+    get_ac_release_tags,
     get_current_ac_version,
     get_current_embedded_ac_version,
     get_current_glean_version,
@@ -21,8 +26,11 @@ from util import (
     get_latest_ac_version,
     get_latest_glean_version,
     get_latest_gv_version,
+    get_metadata_latest,
     get_recent_ac_releases,
     get_recent_fenix_versions,
+    iter_ac_releases,
+    iter_metadata_versions,
     major_gv_version_from_version,
     major_version_from_fenix_release_branch_name,
     match_ac_version,
@@ -221,6 +229,37 @@ def test_get_latest_gv_version_beta_too_new():
         get_latest_gv_version(500, "beta")
 
 
+def test_gecko_view_catalog():
+    omni = [
+        "92.0.20210922161155",
+        "92.0.20210930161155",
+        "93.0.20210923190449",
+        "101.0.20220101000000",
+        "101.0.20220102000000",
+    ]
+    # The last 101 build has not been published as lite yet
+    lite = omni[:4] + ["93.0.20210924190449"]
+    catalog = GeckoViewCatalog(omni, lite)
+
+    assert catalog.latest(92) == "92.0.20210930161155"
+    assert catalog.latest("93") == "93.0.20210923190449"
+    assert catalog.latest() == "101.0.20220101000000"
+    assert catalog.latest(500) is None
+    assert catalog.versions(92) == ["92.0.20210922161155", "92.0.20210930161155"]
+    assert catalog.latest_by_major() == {
+        92: "92.0.20210930161155",
+        93: "93.0.20210923190449",
+        101: "101.0.20220101000000",
+    }
+
+    # A malformed version only breaks lookups of its own major
+    catalog = GeckoViewCatalog(omni + ["93.0.bogus"], lite + ["93.0.bogus"])
+    assert catalog.latest(92) == "92.0.20210930161155"
+    assert catalog.latest() == "101.0.20220101000000"
+    with pytest.raises(ValueError):
+        catalog.latest(93)
+
+
 def test_ac_version_from_tag_good():
     assert ac_version_from_tag("components-v63.0.0") == "63.0.0"
     assert ac_version_from_tag("components-v63.0.1") == "63.0.1"
@@ -241,6 +280,56 @@ def test_get_recent_ac_releases(gh):
     assert get_recent_ac_releases(gh.get_repo("mozilla-mobile/firefox-android")) != []
 
 
+class ReleasesRepo:
+    def __init__(self, tags):
+        self.tags = tags
+        self.consumed = 0
+
+    def get_releases(self):
+        for tag in self.tags:
+            self.consumed += 1
+            yield SimpleNamespace(tag_name=tag)
+
+    def get_git_matching_refs(self, ref):
+        prefix = ref[len("tags/") :]
+        return [
+            SimpleNamespace(ref=f"refs/tags/{tag}")
+            for tag in sorted(self.tags)
+            if tag.startswith(prefix)
+        ]
+
+
+def test_iter_ac_releases_stops_early():
+    repo = ReleasesRepo(
+        [
+            "fenix-v126.0",
+            "components-v126.0",
+            "components-v125.0.2",
+            "components-v125.0.1",
+            "components-v124.0",
+        ]
+    )
+    releases = iter_ac_releases(repo, predicate=lambda v: v.startswith("125."))
+    assert next(releases) == "125.0.2"
+    assert repo.consumed == 3
+
+    repo.consumed = 0
+    assert list(iter_ac_releases(repo, limit=2)) == ["126.0", "125.0.2"]
+    assert repo.consumed == 3
+
+    repo.consumed = 0
+    assert list(iter_ac_releases(repo, max_releases=2)) == ["126.0"]
+    assert repo.consumed == 2
+
+
+def test_get_ac_release_tags():
+    repo = ReleasesRepo(
+        ["components-v125.0.1", "components-v125.0.10", "components-v126.0"]
+    )
+    assert get_ac_release_tags(repo) == ["126.0", "125.0.10", "125.0.1"]
+    assert get_ac_release_tags(repo, 125) == ["125.0.10", "125.0.1"]
+
+
 def test_compare_gv_versions():
     assert compare_gv_versions("82.0.20201008183927", "82.0.20201008183927") == 0
     assert compare_gv_versions("82.0.20191008183927", "82.0.20201008183927") < 0
@@ -264,6 +353,54 @@ def test_get_latest_ac_nightly_version():
     assert get_latest_ac_nightly_version() is not None
 
 
+MAVEN_METADATA = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata>
+  <groupId>org.mozilla.components</groupId>
+  <artifactId>ui-widgets</artifactId>
+  <versioning>
+    <latest>60.0.8</latest>
+    <release>60.0.8</release>
+    <versions>
+      <version>59.0.0</version>
+      <version>60.0.0</version>
+      <version>60.0.8</version>
+    </versions>
+    <lastUpdated>20201027143116</lastUpdated>
+  </versioning>
+</metadata>
+"""
+
+
+def test_iter_metadata_versions():
+    assert list(iter_metadata_versions(MAVEN_METADATA)) == [
+        "59.0.0",
+        "60.0.0",
+        "60.0.8",
+    ]
+    assert list(iter_metadata_versions(MAVEN_METADATA, major=60)) == [
+        "60.0.0",
+        "60.0.8",
+    ]
+    assert list(iter_metadata_versions(MAVEN_METADATA, major=6)) == []
+
+
+def test_iter_metadata_versions_single_version_and_namespace():
+    src = (
+        '<metadata xmlns="http://maven.apache.org/METADATA/1.1.0">'
+        "<version>1.0</version>"
+        "<versioning><versions><version>63.0.2</version></versions></versioning>"
+        "</metadata>"
+    )
+    assert list(iter_metadata_versions(src.encode("utf8"))) == ["63.0.2"]
+
+
+def test_get_metadata_latest_stops_early():
+    assert get_metadata_latest(MAVEN_METADATA) == "60.0.8"
+    # Everything after <latest> is never parsed
+    truncated = MAVEN_METADATA[: MAVEN_METADATA.index("<versions>") + 20]
+    assert get_metadata_latest([truncated.encode("utf8")]) == "60.0.8"
+
+
 @pytest.mark.skip("branch names changed, need to switch to a different test repo")
 def test_get_fenix_release_branches(gh):
     branches = get_fenix_release_branches(gh.get_repo("st3fan/fenix"))
@@ -303,6 +440,42 @@ def test_major_version_from_fenix_release_branch_name():
         major_version_from_fenix_release_branch_name("releases_v84.0.0-beta.1")
 
 
+class MatchingRefsRepo:
+    full_name = "mozilla-mobile/firefox-android"
+
+    def __init__(self, branches):
+        self.branches = branches
+        self.calls = []
+
+    def get_git_matching_refs(self, ref):
+        self.calls.append(ref)
+        prefix = ref[len("heads/") :]
+        return [
+            SimpleNamespace(
+                ref=f"refs/heads/{name}", object=SimpleNamespace(sha=f"sha-{name}")
+            )
+            for name in sorted(self.branches)
+            if name.startswith(prefix)
+        ]
+
+
+def test_get_fenix_release_branches_lists_matching_refs():
+    util.clear_release_branches()
+    snapshot.clear()
+    repo = MatchingRefsRepo(
+        ["releases/v84.0.0", "releases_v125", "releases_v126", "releases_v126-tmp"]
+    )
+    assert get_fenix_release_branches(repo) == ["releases_v125", "releases_v126"]
+    assert repo.calls == ["heads/releases/v", "heads/releases_v"]
+    assert snapshot.get_head_sha(repo, "releases_v126") == "sha-releases_v126"
+
+    # Listed once per run
+    assert get_recent_fenix_versions(repo) == [125, 126]
+    assert len(repo.calls) == 2
+    util.clear_release_branches()
+    snapshot.clear()
+
+
 @pytest.mark.skip("branch names changed since 95/96, need to use a different test repo")
 def test_get_recent_fenix_versions(gh):
     assert get_recent_fenix_versions(gh.get_repo("st3fan/fenix")) == [95, 96]
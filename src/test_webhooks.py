@@ -0,0 +1,143 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+
+import hashlib
+import hmac
+import json
+import threading
+
+import pytest
+import requests
+
+import standins
+import webhooks
+from fakes import FakeClock
+from webhooks import Action, Receiver
+
+
+def test_event_actions():
+    assert webhooks.maven_actions(
+        {
+            "group": "org.mozilla.geckoview",
+            "artifact": "geckoview-beta-omni",
+            "version": "126.0.20240415153215",
+        }
+    ) == (
+        "maven:org.mozilla.geckoview:geckoview-beta-omni:126.0.20240415153215",
+        [Action("update-geckoview", "releases_v126")],
+    )
+    _, actions = webhooks.maven_actions(
+        {
+            "group": "org.mozilla.geckoview",
+            "artifact": "geckoview-nightly-omni-x86_64",
+            "version": "127.0.20240415153215",
+        }
+    )
+    assert actions == [Action("update-geckoview", "main")]
+    _, actions = webhooks.taskcluster_actions(
+        {"routes": ["index.project.application-services.v2.nightly.latest"]}
+    )
+    assert actions == [Action("update-as", "main")]
+    assert webhooks.github_actions(
+        "push", "1234", {"ref": "refs/heads/releases_v126"}
+    ) == ("github:1234", [Action("update-geckoview", "releases_v126")])
+    assert webhooks.github_actions("push", "1235", {"ref": "refs/heads/main"})[1] == []
+
+
+def test_receiver_drops_duplicates_and_debounces():
+    clock = FakeClock()
+    receiver = Receiver(debounce=60, clock=clock)
+    action = Action("update-geckoview", "main")
+    assert receiver.submit("a", [action])
+    assert not receiver.submit("a", [action])
+    clock.now = 50
+    # A burst pushes the action back
+    assert receiver.submit("b", [action])
+    clock.now = 100
+    assert receiver.pop_due() == []
+    assert receiver.next_due() == 10
+    clock.now = 110
+    assert receiver.pop_due() == [action]
+    assert receiver.pop_due() == []
+    assert receiver.next_due() is None
+
+
+@pytest.fixture
+def server():
+    receiver = Receiver(debounce=0)
+    server = webhooks.create_server(receiver, port=0, secret="s3cret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, path, payload, secret="s3cret", headers=None):
+    body = json.dumps(payload).encode("utf8")
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return requests.post(
+        f"http://127.0.0.1:{server.server_port}{path}",
+        data=body,
+        headers={"X-Hub-Signature-256": f"sha256={signature}", **(headers or {})},
+    )
+
+
+def test_receiving_events(server):
+    push = {"ref": "refs/heads/releases_v126", "after": "a" * 40}
+    headers = {"X-GitHub-Event": "push", "X-GitHub-Delivery": "42"}
+    r = post(server, "/github", push, headers=headers)
+    assert r.status_code == 202
+    assert r.json() == {"actions": [["update-geckoview", "releases_v126"]]}
+    assert post(server, "/github", push, headers=headers).json() == {"duplicate": True}
+    assert post(server, "/github", push, secret="wrong").status_code == 401
+    assert post(server, "/maven", {"group": "x"}).status_code == 400
+    assert post(server, "/maven", []).status_code == 400
+    assert post(server, "/taskcluster", {"routes": 1}).status_code == 400
+    too_large = requests.post(
+        f"http://127.0.0.1:{server.server_port}/github",
+        data=b" " * (webhooks.MAX_BODY + 1),
+    )
+    assert too_large.status_code == 413
+    assert post(server, "/fenix", {}).status_code == 404
+    assert server.receiver.pop_due() == [Action("update-geckoview", "releases_v126")]
+
+
+def test_only_listens_locally_without_a_secret():
+    for secret, host in (("", "127.0.0.1"), ("s3cret", "0.0.0.0")):
+        server = webhooks.create_server(Receiver(), port=0, secret=secret)
+        assert server.server_address[0] == host
+        server.server_close()
+
+
+def test_serve_runs_the_affected_task():
+    stop = threading.Event()
+    receiver = Receiver(debounce=0)
+    server = webhooks.create_server(receiver, port=0, secret="")
+    with standins.running() as env:
+        firefox = env.github.repos["mozilla-mobile/firefox-android"]
+
+        def run(action):
+            webhooks.run_action(
+                action, env.firefox_repo, env.rb_repo, env.author, False, False
+            )
+            stop.set()
+
+        receiver.submit(
+            *webhooks.maven_actions(
+                {
+                    "group": "org.mozilla.geckoview",
+                    "artifact": "geckoview-beta-omni",
+                    "version": "126.0.20240303185343",
+                }
+            )
+        )
+        webhooks.serve(run, stop, receiver, server)
+        assert [pull["head"] for pull in firefox.pulls] == [
+            "relbot/upgrade-geckoview-ac-126"
+        ]
+        # Only the affected branch was looked at
+        assert "releases_v125" not in str(env.github.calls)
+        assert env.maven.calls["GET maven-metadata.xml"] == 2
@@ -0,0 +1,191 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Trace where the time of a run goes.
+#
+# Once installed, every outbound request made through http_session (Maven,
+# Taskcluster, GitHub REST through PyGithub and GitHub GraphQL) is recorded as
+# a span with its status, size, latency and retries. Functions decorated with
+# @traced record a span too, and the requests they make are nested under it,
+# and under the task they run in. Tracing is off unless RELBOT_TRACE names the
+# JSON file to write the trace to.
+#
+
+
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import http_session
+from tasks import current_task
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TOP = 10
+
+# Spans recorded beyond this are dropped, to bound memory in long runs
+DEFAULT_MAX_SPANS = 100_000
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, max_spans=DEFAULT_MAX_SPANS, clock=time.monotonic):
+        self.max_spans = max_spans
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.origin = clock()
+        self.spans = []
+        self.dropped = 0
+
+    def _record(self, span):
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+            else:
+                self.spans.append(span)
+
+    def observe(self, event):
+        """Record a request made through http_session."""
+        end = self._clock() - self.origin
+        self._record(
+            {
+                "id": next(self._ids),
+                "parent": current_span.get(),
+                "task": current_task.get(),
+                "kind": "request",
+                "name": f"{event.service} {event.method}",
+                "url": event.url,
+                "status": event.status,
+                "bytes": event.bytes,
+                "retries": event.retries,
+                "start": round(end - event.elapsed, 6),
+                "duration": round(event.elapsed, 6),
+            }
+        )
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Record the block as an operation span called name. Requests and
+        spans started in the block are nested under it."""
+        span_id = next(self._ids)
+        parent = current_span.get()
+        token = current_span.set(span_id)
+        start = self._clock() - self.origin
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            current_span.reset(token)
+            self._record(
+                {
+                    "id": span_id,
+                    "parent": parent,
+                    "task": current_task.get(),
+                    "kind": "operation",
+                    "name": name,
+                    "status": status,
+                    "start": round(start, 6),
+                    "duration": round(self._clock() - self.origin - start, 6),
+                    **attributes,
+                }
+            )
+
+    def slowest(self, n=DEFAULT_TOP):
+        """Return the n slowest requests, slowest first."""
+        with self._lock:
+            requests = [span for span in self.spans if span["kind"] == "request"]
+        return sorted(requests, key=lambda span: span["duration"], reverse=True)[:n]
+
+    def summary(self, n=DEFAULT_TOP):
+        """Return a human readable list of the n slowest requests."""
+        lines = [f"{len(self.spans)} span(s) traced, slowest requests:"]
+        for span in self.slowest(n):
+            task = f"[{span['task']}] " if span["task"] else ""
+            lines.append(
+                f"  {span['duration'] * 1000:8.1f} ms {task}{span['name']} "
+                f"{span['url']} -> {span['status']}, {span['bytes']} bytes"
+                + (f", {span['retries']} retries" if span["retries"] else "")
+            )
+        return "\n".join(lines)
+
+    def write(self, path):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+            dropped = self.dropped
+        with open(path, "w") as f:
+            json.dump({"spans": spans, "dropped": dropped}, f, indent=1)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+            self.dropped = 0
+
+
+_tracer = None
+
+
+def install(tracer=None):
+    """Trace every request made through http_session with tracer."""
+    global _tracer
+    uninstall()
+    _tracer = tracer or Tracer()
+    http_session.add_observer(_tracer.observe)
+    return _tracer
+
+
+def install_from_env():
+    """Install a tracer if RELBOT_TRACE is set."""
+    if os.getenv("RELBOT_TRACE"):
+        return install()
+    return None
+
+
+def uninstall():
+    global _tracer
+    if _tracer is not None:
+        http_session.remove_observer(_tracer.observe)
+        _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+def traced(fn):
+    """Record every call of fn as an operation span."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return fn(*args, **kwargs)
+        with _tracer.span(fn.__qualname__):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def flush():
+    """Write the trace to RELBOT_TRACE, log the slowest requests and start
+    over. Does nothing when tracing is off."""
+    if _tracer is None:
+        return
+    path = os.getenv("RELBOT_TRACE")
+    if path:
+        _tracer.write(path)
+        log.info(f"Trace written to {path}")
+    top = int(os.getenv("RELBOT_TRACE_TOP") or DEFAULT_TOP)
+    log.info(_tracer.summary(top))
+    _tracer.clear()
@@ -3,17 +3,35 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/
 
 
+import functools
+import hashlib
 import json
 import logging
-import os.path
+import os
 import re
+import threading
+from collections import namedtuple
 from urllib.parse import quote_plus
+from xml.etree import ElementTree
 
-import requests
-import xmltodict
-from github import GithubException
 from mozilla_version.mobile import MobileVersion
 
+import http_session
+import snapshot
+import state
+from changeset import ChangeSet
+from extractors import (  # noqa: F401
+    extract_field,
+    validate_as_channel,
+    validate_as_version,
+    validate_glean_version,
+    validate_gv_channel,
+    validate_gv_version,
+)
+from ratelimit import PRIORITY_MAIN, ScheduledTask, schedule, task_cost
+from tasks import run_tasks
+from tracing import traced
+
 log = logging.getLogger(__name__)
 
 
@@ -34,19 +52,14 @@ def get_app_services_version_path(ac_major_version):
     )
 
 
-def validate_gv_version(v):
-    """Validate that v is in the format of 82.0.20201027185343.
-    Returns v or raises an exception."""
-    if not re.match(r"^\d{2,}\.\d\.\d{14}$", v):
-        raise Exception(f"Invalid GV version {v}")
-    return v
-
-
-def validate_gv_channel(c):
-    """Validate that c is release, production or beta"""
-    if c not in ("release", "beta", "nightly"):
-        raise Exception(f"Invalid GV channel {c}")
-    return c
+def get_dependency_file_paths(ac_major_version):
+    """Return the files that describe the dependencies of an A-C branch"""
+    return [
+        "version.txt",
+        get_gecko_file_path(ac_major_version),
+        get_dependencies_file_path(ac_major_version),
+        get_app_services_version_path(ac_major_version),
+    ]
 
 
 def major_gv_version_from_version(v):
@@ -56,16 +69,15 @@ def major_gv_version_from_version(v):
 
 
 def match_ac_version(src):
-    if match := re.compile(r'VERSION = "([^"]*)"', re.MULTILINE).search(src):
-        version = match[1]
-        MobileVersion.parse(version)
+    if version := extract_field("android_components", src, "ac_version"):
         return version
     raise Exception("Could not match the VERSION in AndroidComponents.kt")
 
 
 def get_current_embedded_ac_version(repo, release_branch_name, target_path=""):
     """Return the current A-C version used on the given branch"""
-    content_file = repo.get_contents(
+    content_file = snapshot.get_contents(
+        repo,
         f"{target_path}buildSrc/src/main/java/AndroidComponents.kt",
         ref=release_branch_name,
     )
@@ -74,39 +86,37 @@ def get_current_embedded_ac_version(repo, release_branch_name, target_path=""):
 
 def match_gv_version(src):
     """Find the GeckoView version in the contents of the given Gecko.kt file."""
-    if match := re.compile(r'version\(?\)? = "([^"]*)"', re.MULTILINE).search(src):
-        return validate_gv_version(match[1])
+    if version := extract_field("gecko", src, "gv_version"):
+        return version
     raise Exception("Could not match the version in Gecko.kt")
 
 
 def get_current_gv_version(ac_repo, release_branch_name, ac_major_version):
     """Return the current gv version used on the given release branch"""
-    content_file = ac_repo.get_contents(
-        get_gecko_file_path(ac_major_version), ref=release_branch_name
+    content_file = snapshot.get_contents(
+        ac_repo, get_gecko_file_path(ac_major_version), ref=release_branch_name
     )
     return match_gv_version(content_file.decoded_content.decode("utf8"))
 
 
 def match_gv_channel(src):
     """Find the GeckoView channel in the contents of the given Gecko.kt file."""
-    if match := re.compile(
-        r"channel\(?\)? = GeckoChannel.(NIGHTLY|BETA|RELEASE)", re.MULTILINE
-    ).search(src):
-        return validate_gv_channel(match[1].lower())
+    if channel := extract_field("gecko", src, "gv_channel"):
+        return channel
     raise Exception("Could not match the channel in Gecko.kt")
 
 
 def get_current_gv_channel(ac_repo, release_branch_name, ac_major_version):
     """Return the current gv channel used on the given release branch"""
-    content_file = ac_repo.get_contents(
-        get_gecko_file_path(ac_major_version), ref=release_branch_name
+    content_file = snapshot.get_contents(
+        ac_repo, get_gecko_file_path(ac_major_version), ref=release_branch_name
     )
     return match_gv_channel(content_file.decoded_content.decode("utf8"))
 
 
 def get_current_ac_version(repo, release_branch_name):
     """Return the current ac version used on the given release branch"""
-    content_file = repo.get_contents("version.txt", ref=release_branch_name)
+    content_file = snapshot.get_contents(repo, "version.txt", ref=release_branch_name)
     content = content_file.decoded_content.decode("utf8")
     ac_version = content.strip()
     MobileVersion.parse(ac_version)
@@ -118,17 +128,25 @@ def get_latest_ac_version_for_major_version(ac_repo, ac_major_version):
     return get_current_ac_version(ac_repo, f"releases_v{ac_major_version}")
 
 
-MAVEN = "https://maven.mozilla.org/maven2"
+# Upstream locations can be overridden to point relbot at local stand-ins.
+MAVEN = os.getenv("RELBOT_MAVEN_URL", "https://maven.mozilla.org/maven2")
+MAVEN_NIGHTLY = os.getenv(
+    "RELBOT_MAVEN_NIGHTLY_URL", "https://nightly.maven.mozilla.org/maven2"
+)
+TASKCLUSTER_ROOT_URL = os.getenv(
+    "RELBOT_TASKCLUSTER_ROOT_URL", "https://firefox-ci-tc.services.mozilla.com"
+)
 
 
 def taskcluster_indexed_artifact_url(index_name, artifact_path):
     artifact_path = quote_plus(artifact_path)
     return (
-        "https://firefox-ci-tc.services.mozilla.com/"
+        f"{TASKCLUSTER_ROOT_URL}/"
         f"api/index/v1/task/{index_name}/artifacts/{artifact_path}"
     )
 
 
+@traced
 def get_latest_glean_version(gv_version, channel):
     name = "geckoview"
     if channel != "release":
@@ -137,7 +155,15 @@ def get_latest_glean_version(gv_version, channel):
     # See https://github.com/mozilla-mobile/android-components/commit/0b349f48c91a50bb7b4ffbf40c6c122ed18142d3  # noqa E501
     name += "-omni"
 
-    r = requests.get(
+    # What a published build bundles never changes
+    store = state.get_state()
+    if store is not None:
+        if (
+            glean_version := store.get_fact("glean", f"{name}:{gv_version}")
+        ) is not None:
+            return glean_version
+
+    r = http_session.get(
         f"{MAVEN}/org/mozilla/geckoview/{name}/{gv_version}/{name}-{gv_version}.module"
     )
     r.raise_for_status()
@@ -156,74 +182,232 @@ def get_latest_glean_version(gv_version, channel):
             f"GeckoView {channel.capitalize()} {gv_version}"
         )
 
+    if store is not None:
+        store.set_fact("glean", f"{name}:{gv_version}", versions[0])
     return versions[0]
 
 
-def get_latest_gv_version(gv_major_version, channel):
-    """Find the last geckoview beta release version on Maven
-    for the given major version"""
+# maven-metadata.xml is fed to the parser in chunks of this size, so that
+# parsing stops early once the wanted elements have been seen. The document
+# itself is downloaded, or read from the HTTP cache, in full.
+METADATA_CHUNK_SIZE = 16 * 1024
+
+
+def _iter_metadata_elements(src, paths):
+    """Yield (path, text) for the elements of a maven-metadata.xml document
+    whose path, like "versioning/latest", is in paths, in document order. src
+    is the document as str or bytes, or an iterable of bytes chunks. Nothing
+    past the element the caller stops at is parsed."""
+    if isinstance(src, str):
+        src = src.encode("utf8")
+    chunks = src
+    if isinstance(src, bytes):
+        chunks = (
+            src[offset : offset + METADATA_CHUNK_SIZE]
+            for offset in range(0, len(src), METADATA_CHUNK_SIZE)
+        )
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    tags = []
+    elements = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                # Ignore the namespace some publishers add
+                tags.append(element.tag.rsplit("}", 1)[-1])
+                elements.append(element)
+                continue
+            path = "/".join(tags[1:])
+            tags.pop()
+            elements.pop()
+            if path in paths:
+                yield path, (element.text or "").strip()
+            # Drop finished elements so memory does not grow with the document
+            if elements:
+                elements[-1].clear()
+    parser.close()
+
+
+def iter_metadata_versions(src, major=None):
+    """Lazily yield the versions listed in a maven-metadata.xml document.
+    With major set, only versions of that major version are yielded."""
+    prefix = None if major is None else f"{major}."
+    for _, version in _iter_metadata_elements(src, ("versioning/versions/version",)):
+        if prefix is None or version.startswith(prefix):
+            yield version
+
+
+def get_metadata_latest(src):
+    """Return the <latest> version of a maven-metadata.xml document, without
+    parsing the list of versions that follows it."""
+    for _, latest in _iter_metadata_elements(src, ("versioning/latest",)):
+        return latest
+    raise Exception("Could not find the latest version in maven-metadata.xml")
+
+
+def metadata_validator(response):
+    """Return a string that changes whenever the document in response does:
+    its ETag or Last-Modified header, or a digest of its body when it has
+    neither."""
+    return (
+        response.headers.get("ETag")
+        or response.headers.get("Last-Modified")
+        or hashlib.sha256(response.content).hexdigest()
+    )
+
+
+GV_ARCHITECTURES = ("arm64-v8a", "armeabi-v7a", "x86", "x86_64")
+
+
+def gv_maven_name(channel):
+    """Return the Maven artifact name of the GeckoView lite build for channel"""
     if channel not in ("nightly", "beta", "release"):
         raise Exception(f"Invalid channel {channel}")
+    return "geckoview" if channel == "release" else f"geckoview-{channel}"
+
+
+class GeckoViewCatalog:
+    """The GeckoView versions published as both omni and lite builds.
+
+    A-C builds against geckoview-omni, but geckoview-omni requires exoplayer2
+    which comes from the lite build, so only versions present in both count.
+    Versions are bucketed by major version, and a major is sorted the first
+    time it is looked up, so a malformed version only fails lookups of its
+    own major. validator changes whenever the metadata the catalog was built
+    from does."""
+
+    def __init__(self, omni_versions, lite_versions, validator=None):
+        self.validator = validator
+        lite_versions = set(lite_versions)
+        self._buckets = {}
+        for version in omni_versions:
+            if version in lite_versions:
+                major = version.split(".", 1)[0]
+                self._buckets.setdefault(major, []).append(version)
+        self._sorted = set()
+        self._lock = threading.Lock()
+
+    def _sorted_versions(self, major):
+        key = str(major)
+        with self._lock:
+            versions = self._buckets.get(key, [])
+            if key not in self._sorted:
+                versions.sort(key=gv_version_sort_key)
+                self._sorted.add(key)
+            return versions
+
+    def _majors(self):
+        return [int(major) for major in self._buckets if major.isdigit()]
+
+    def versions(self, major):
+        """Return all versions of major, oldest first."""
+        return list(self._sorted_versions(major))
+
+    def latest(self, major=None):
+        """Return the latest version of major, or of all versions when major
+        is None. Returns None if there is no such version."""
+        if major is None:
+            if not (majors := self._majors()):
+                return None
+            major = max(majors)
+        versions = self._sorted_versions(major)
+        return versions[-1] if versions else None
+
+    def latest_by_major(self):
+        """Return {major: latest version} for every major version."""
+        return {major: self.latest(major) for major in self._majors()}
+
+
+_gv_catalogs = {}
+_gv_catalogs_lock = threading.Lock()
+_gv_catalog_locks = {}
+
+
+@traced
+def get_gv_catalog(channel, concurrent=True):
+    """Return the GeckoViewCatalog of channel. It is built once per run and
+    shared by all branches."""
+    with _gv_catalogs_lock:
+        lock = _gv_catalog_locks.setdefault(channel, threading.Lock())
+    with lock:
+        if channel in _gv_catalogs:
+            return _gv_catalogs[channel]
+
+        name_lite = gv_maven_name(channel)
+        name = f"{name_lite}-omni"
+        # Both metadata documents are independent, so fetch them in one go
+        responses = http_session.get_all(
+            [
+                f"{MAVEN}/org/mozilla/geckoview/{name}/maven-metadata.xml",
+                f"{MAVEN}/org/mozilla/geckoview/{name_lite}/maven-metadata.xml",
+            ],
+            concurrent=concurrent,
+        )
+        for r in responses:
+            r.raise_for_status()
+        catalog = GeckoViewCatalog(
+            iter_metadata_versions(responses[0].content),
+            iter_metadata_versions(responses[1].content),
+            " ".join(metadata_validator(r) for r in responses),
+        )
+        _gv_catalogs[channel] = catalog
+        return catalog
 
-    # Find the latest release in the multi-arch .aar
 
-    name = "geckoview"
-    if channel != "release":
-        name += "-" + channel
-    # A-C builds against geckoview-omni
-    # See https://github.com/mozilla-mobile/android-components/commit/0b349f48c91a50bb7b4ffbf40c6c122ed18142d3  # noqa E501
-    # However, geckoview-omni requires exoplayer2 which comes
-    # from the lite build, so check for that too
-    name_lite = name
-    name += "-omni"
+def clear_gv_catalogs():
+    """Forget the catalogs fetched during this run."""
+    with _gv_catalogs_lock:
+        _gv_catalogs.clear()
 
-    r = requests.get(f"{MAVEN}/org/mozilla/geckoview/{name}/maven-metadata.xml")
-    r.raise_for_status()
-    metadata = xmltodict.parse(r.text)
-    r = requests.get(f"{MAVEN}/org/mozilla/geckoview/{name_lite}/maven-metadata.xml")
-    r.raise_for_status()
-    lite_metadata = xmltodict.parse(r.text)
 
-    versions = [
-        v
-        for v in metadata["metadata"]["versioning"]["versions"]["version"]
-        if (gv_major_version is None or v.startswith(f"{gv_major_version}."))
-        and v in lite_metadata["metadata"]["versioning"]["versions"]["version"]
-    ]
+@traced
+def get_latest_gv_version(gv_major_version, channel, concurrent=True):
+    """Find the last geckoview beta release version on Maven
+    for the given major version. With concurrent set, the metadata documents
+    and the per-architecture checks are each fetched in parallel."""
+    # A-C builds against geckoview-omni
+    # See https://github.com/mozilla-mobile/android-components/commit/0b349f48c91a50bb7b4ffbf40c6c122ed18142d3  # noqa E501
+    name = f"{gv_maven_name(channel)}-omni"
 
-    if len(versions) == 0:
+    latest = get_gv_catalog(channel, concurrent).latest(gv_major_version)
+    if latest is None:
         raise Exception(
             f"Could not find any GeckoView {channel.capitalize()} "
             f"{gv_major_version} releases"
         )
 
-    latest = max(versions, key=gv_version_sort_key)
+    # Make sure this release has been uploaded for all architectures. Once it
+    # has been, that does not change.
 
-    # Make sure this release has been uploaded for all architectures.
+    store = state.get_state()
+    if store is not None and store.get_fact("gv-uploaded", f"{name}:{latest}"):
+        return latest
 
-    for arch in ("arm64-v8a", "armeabi-v7a", "x86", "x86_64"):
-        r = requests.get(
+    responses = http_session.get_all(
+        [
             f"{MAVEN}/org/mozilla/geckoview/{name}-{arch}/"
             f"{latest}/{name}-{arch}-{latest}.pom"
-        )
+            for arch in GV_ARCHITECTURES
+        ],
+        concurrent=concurrent,
+    )
+    for r in responses:
         r.raise_for_status()
 
+    if store is not None:
+        store.set_fact("gv-uploaded", f"{name}:{latest}", True)
     return latest
 
 
+@traced
 def get_latest_ac_version(ac_major_version):
     """Find the last android-components release on Maven for the given major version"""
-    r = requests.get(
-        "https://maven.mozilla.org/maven2/org/mozilla/components/ui-widgets/maven-metadata.xml"  # noqa E501
+    r = http_session.get(
+        f"{MAVEN}/org/mozilla/components/ui-widgets/maven-metadata.xml"
     )
     r.raise_for_status()
 
-    metadata = xmltodict.parse(r.text)
-
-    versions = []
-    for version in metadata["metadata"]["versioning"]["versions"]["version"]:
-        if version.startswith(f"{ac_major_version}."):
-            versions.append(version)
+    versions = list(iter_metadata_versions(r.content, major=ac_major_version))
 
     if len(versions) == 0:
         raise Exception(
@@ -234,15 +418,15 @@ def get_latest_ac_version(ac_major_version):
     return max(versions, key=MobileVersion.parse)
 
 
+@traced
 def get_latest_ac_nightly_version():
     """Find the last android-components Nightly release on Maven
     for the given major version"""
-    r = requests.get(
-        "https://nightly.maven.mozilla.org/maven2/org/mozilla/components/ui-widgets/maven-metadata.xml"  # noqa E501
+    r = http_session.get(
+        f"{MAVEN_NIGHTLY}/org/mozilla/components/ui-widgets/maven-metadata.xml"
     )
     r.raise_for_status()
-    metadata = xmltodict.parse(r.text)
-    return metadata["metadata"]["versioning"]["latest"]
+    return get_metadata_latest(r.content)
 
 
 def ac_version_from_tag(tag):
@@ -254,15 +438,44 @@ def ac_version_from_tag(tag):
     return version
 
 
+def iter_ac_releases(repo, predicate=None, limit=None, max_releases=None):
+    """Lazily yield the A-C versions of the releases of repo, newest first.
+
+    Releases are paged in only as far as needed: iteration stops after limit
+    versions matching predicate, or after looking at max_releases releases.
+    Each tag is parsed once."""
+    if limit is not None and limit <= 0:
+        return
+    found = 0
+    for seen, release in enumerate(repo.get_releases(), start=1):
+        version = ac_version_from_tag(release.tag_name)
+        if version and (predicate is None or predicate(version)):
+            yield version
+            found += 1
+            if limit is not None and found >= limit:
+                return
+        if max_releases is not None and seen >= max_releases:
+            return
+
+
 def get_recent_ac_releases(repo):
-    releases = repo.get_releases()
-    if releases.totalCount == 0:
-        return []
-    return [
-        ac_version_from_tag(release.tag_name)
-        for release in releases[:50]
-        if ac_version_from_tag(release.tag_name)
+    """Return the A-C versions of the last 50 releases of repo, newest first."""
+    return list(iter_ac_releases(repo, max_releases=50))
+
+
+def get_ac_release_tags(repo, ac_major_version=None):
+    """Return the A-C versions tagged in repo, newest first. The tags are
+    filtered by prefix on the server, down to a single major version when
+    ac_major_version is given."""
+    prefix = "components-v"
+    if ac_major_version is not None:
+        prefix += f"{ac_major_version}."
+    versions = [
+        version
+        for ref in repo.get_git_matching_refs(f"tags/{prefix}")
+        if (version := ac_version_from_tag(ref.ref[len("refs/tags/") :]))
     ]
+    return sorted(versions, key=MobileVersion.parse, reverse=True)
 
 
 def compare_gv_versions(a, b):
@@ -278,12 +491,40 @@ def gv_version_sort_key(a):
     return int(a[0]) * 10000000000000000000 + int(a[1]) * 1000000000000000 + int(a[2])
 
 
+# Release branches are named releases_vN, or releases/vN for older releases.
+RELEASE_BRANCH_PREFIXES = ("releases/v", "releases_v")
+
+_release_branches = {}
+_release_branches_lock = threading.Lock()
+
+
+@traced
 def get_fenix_release_branches(repo):
-    return [
-        branch.name
-        for branch in repo.get_branches()
-        if re.match(r"^releases[_/]v\d+$", branch.name)
-    ]
+    """Return the names of the release branches of repo. Only refs under the
+    release branch prefixes are listed, so the cost depends on the number of
+    release branches rather than of all branches. The list is fetched once
+    per run, and the branch heads it returns are recorded in the snapshot."""
+    with _release_branches_lock:
+        if repo.full_name in _release_branches:
+            return list(_release_branches[repo.full_name])
+
+    branches = []
+    for prefix in RELEASE_BRANCH_PREFIXES:
+        for ref in repo.get_git_matching_refs(f"heads/{prefix}"):
+            name = ref.ref[len("refs/heads/") :]
+            if re.match(r"^releases[_/]v\d+$", name):
+                branches.append(name)
+                snapshot.set_head_sha(repo, name, ref.object.sha)
+
+    with _release_branches_lock:
+        _release_branches[repo.full_name] = branches
+    return list(branches)
+
+
+def clear_release_branches():
+    """Forget the release branches listed during this run."""
+    with _release_branches_lock:
+        _release_branches.clear()
 
 
 def major_version_from_fenix_release_branch_name(branch_name):
@@ -311,52 +552,21 @@ def use_legacy_as_handling(ac_major_version):
     return ac_major_version < 114
 
 
-def validate_as_version(v):
-    """Validate that v is in the format of 100.0 Returns v or raises an exception."""
-
-    if match := re.match(r"(^\d+)\.\d+\.\d+$", v):
-        # application-services used to have its own 3-component version system,
-        # ending with version 97
-        if int(match.group(1)) <= 97:
-            return v
-
-    if match := re.match(r"(^\d+)\.\d+$", v):
-        # Application-services switched to following the 2-component the
-        # Firefox version number in v114
-        if int(match.group(1)) >= 114:
-            return v
-    raise Exception(f"Invalid version format {v}")
-
-
-def validate_as_channel(c):
-    """Validate that c is a valid app-services channel."""
-    if c in ("staging", "nightly_staging"):
-        # These are channels are valid, but only used for preview builds.  We don't have
-        # any way of auto-updating them
-        raise Exception(f"Can't update AS channel {c}")
-    if c not in ("release", "nightly"):
-        raise Exception(f"Invalid AS channel {c}")
-    return c
-
-
 def get_current_as_version(ac_repo, release_branch_name, ac_major_version):
     """Return the current as version used on the given release branch"""
     if use_legacy_as_handling(ac_major_version):
         # The version used to be listed in `DependenciesPlugin.kt`
         path = get_dependencies_file_path(ac_major_version)
-        regex = re.compile(
-            r'const val mozilla_appservices = "([^"]*)"',
-            re.MULTILINE,
-        )
+        kind = "dependencies"
     else:
         # The version is now stored in `ApplicationServices.kt`
         path = get_app_services_version_path(ac_major_version)
-        regex = re.compile(r'val VERSION = "([\d\.]+)"', re.MULTILINE)
+        kind = "app_services"
 
-    content_file = ac_repo.get_contents(path, ref=release_branch_name)
+    content_file = snapshot.get_contents(ac_repo, path, ref=release_branch_name)
     src = content_file.decoded_content.decode("utf8")
-    if match := regex.search(src):
-        return validate_as_version(match[1])
+    if version := extract_field(kind, src, "as_version"):
+        return version
     raise Exception(
         f"Could not find application services version in {os.path.basename(path)}"
     )
@@ -367,12 +577,8 @@ def match_as_channel(src):
     Find the ApplicationServicesChannel channel in the contents of the given
     ApplicationServicesChannel.kt file.
     """
-    if match := re.compile(
-        r"val CHANNEL = ApplicationServicesChannel."
-        r"(NIGHTLY|NIGHTLY_STAGING|STAGING|RELEASE)",
-        re.MULTILINE,
-    ).search(src):
-        return validate_as_channel(match[1].lower())
+    if channel := extract_field("app_services", src, "as_channel"):
+        return channel
     raise Exception("Could not match the channel in ApplicationServices.kt")
 
 
@@ -383,32 +589,26 @@ def get_current_as_channel(ac_repo, release_branch_name, ac_major_version):
         return "release"
     else:
         # The channel is now stored in the `ApplicationServices.kt` file
-        content_file = ac_repo.get_contents(
-            get_app_services_version_path(ac_major_version), ref=release_branch_name
+        content_file = snapshot.get_contents(
+            ac_repo,
+            get_app_services_version_path(ac_major_version),
+            ref=release_branch_name,
         )
         return match_as_channel(content_file.decoded_content.decode("utf8"))
 
 
-def validate_glean_version(v):
-    """Validate that v is in the format of 63.0.2. Returns v or raises an exception."""
-    if not re.match(r"^\d+\.\d+.\d+$", v):
-        raise Exception(f"Invalid version format {v}")
-    return v
-
-
 def match_glean_version(src):
     """Find the Glean version in the contents of the given
     DependenciesPlugin.kt file."""
-    if match := re.compile(r'const val mozilla_glean = "([^"]*)"', re.MULTILINE).search(
-        src
-    ):
-        return validate_glean_version(match[1])
+    if version := extract_field("dependencies", src, "glean_version"):
+        return version
     raise Exception("Could not match glean in DependenciesPlugin.kt")
 
 
 def get_current_glean_version(ac_repo, release_branch_name, ac_major_version):
     """Return the current Glean version used on the given release branch"""
-    content_file = ac_repo.get_contents(
+    content_file = snapshot.get_contents(
+        ac_repo,
         get_dependencies_file_path(ac_major_version),
         ref=release_branch_name,
     )
@@ -426,6 +626,7 @@ def as_version_sort_key(v):
     return int(a[0]) * 1000000 + int(a[1]) * 1000 + int(a[2])
 
 
+@traced
 def get_latest_as_version(as_major_version, as_channel):
     """Find the last A-S version on Maven for the given major version"""
 
@@ -433,7 +634,7 @@ def get_latest_as_version(as_major_version, as_channel):
         return get_latest_as_version_legacy(as_major_version)
 
     if as_channel == "nightly":
-        r = requests.get(
+        r = http_session.get(
             taskcluster_indexed_artifact_url(
                 "project.application-services.v2.nightly.latest",
                 "public/build/nightly.json",
@@ -445,19 +646,16 @@ def get_latest_as_version(as_major_version, as_channel):
         raise NotImplementedError("Only the AS nightly channel is currently supported")
 
 
+@traced
 def get_latest_as_version_legacy(as_major_version):
     # For App-services versions up until v97, we need to get the version number
     # from the multi-arch .aar
 
     # TODO What is the right package to check here? full-megazord metadata seems broken.
-    r = requests.get(f"{MAVEN}/org/mozilla/appservices/nimbus/maven-metadata.xml")
+    r = http_session.get(f"{MAVEN}/org/mozilla/appservices/nimbus/maven-metadata.xml")
     r.raise_for_status()
-    metadata = xmltodict.parse(r.text)
 
-    versions = []
-    for version in metadata["metadata"]["versioning"]["versions"]["version"]:
-        if version.startswith(f"{as_major_version}."):
-            versions.append(version)
+    versions = list(iter_metadata_versions(r.content, major=as_major_version))
 
     if len(versions) == 0:
         raise Exception(f"Could not find any A-S {as_major_version} releases")
@@ -478,13 +676,21 @@ def compare_as_versions(a, b):
     return (a > b) - (a < b)
 
 
-def _update_ac_version(
-    repo, branch, old_ac_version, new_ac_version, author, target_path=""
-):
-    contents = repo.get_contents(
-        f"{target_path}buildSrc/src/main/java/AndroidComponents.kt", ref=branch
-    )
-    content = contents.decoded_content.decode("utf-8")
+# Every PR branch relbot creates lives under this prefix
+PR_BRANCH_PREFIX = "relbot/"
+
+
+def pr_branch_exists(repo, pr_branch_name):
+    """Return True if the PR branch pr_branch_name exists on repo. All PR
+    branches of repo are listed once per run, so this is a lookup."""
+    if not pr_branch_name.startswith(PR_BRANCH_PREFIX):
+        raise ValueError(f"{pr_branch_name} is not under {PR_BRANCH_PREFIX}")
+    return pr_branch_name in snapshot.get_branch_names(repo, PR_BRANCH_PREFIX)
+
+
+def _update_ac_version(changes, old_ac_version, new_ac_version, target_path=""):
+    path = f"{target_path}buildSrc/src/main/java/AndroidComponents.kt"
+    content = changes.read(path)
     new_content = content.replace(
         f'VERSION = "{old_ac_version}"', f'VERSION = "{new_ac_version}"'
     )
@@ -493,25 +699,29 @@ def _update_ac_version(
             "Update to AndroidComponents.kt resulted in no changes: "
             "maybe the file was already up to date?"
         )
-    repo.update_file(
-        contents.path,
-        f"Update to Android-Components {new_ac_version}.",
-        new_content,
-        contents.sha,
-        branch=branch,
-        author=author,
-    )
+    changes.write(path, new_content, f"Update to Android-Components {new_ac_version}.")
 
 
+@traced
 def update_android_components_nightly(
-    ac_repo, target_repo, target_path, author, debug, release_branch_name, dry_run
+    ac_repo,
+    target_repo,
+    target_path,
+    author,
+    debug,
+    release_branch_name,
+    dry_run,
+    latest_ac_nightly_version=None,
 ):
+    """Update target_repo to the latest A-C nightly, unless it is already on
+    it. Returns the URL of the pull request, or None if none was opened."""
     current_ac_version = get_current_embedded_ac_version(
         target_repo, release_branch_name, target_path
     )
     log.info(f"Current A-C version in {target_repo} is {current_ac_version}")
 
-    latest_ac_nightly_version = get_latest_ac_nightly_version()
+    if latest_ac_nightly_version is None:
+        latest_ac_nightly_version = get_latest_ac_nightly_version()
 
     parsed_current_ac = MobileVersion.parse(current_ac_version)
     parsed_latest_ac = MobileVersion.parse(latest_ac_nightly_version)
@@ -531,33 +741,21 @@ def update_android_components_nightly(
 
     pr_branch_name = f"relbot/AC-Nightly-{latest_ac_nightly_version}"
 
-    try:
-        if target_repo.get_branch(pr_branch_name):
-            log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
-            return
-    except GithubException:
-        pass
-
-    release_branch = target_repo.get_branch(release_branch_name)
-    log.info(f"Last commit on {release_branch_name} is {release_branch.commit.sha}")
+    if pr_branch_exists(target_repo, pr_branch_name):
+        log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
+        return
 
-    log.info(f"Creating branch {pr_branch_name} on {release_branch.commit.sha}")
-    target_repo.create_git_ref(
-        ref=f"refs/heads/{pr_branch_name}", sha=release_branch.commit.sha
-    )
+    changes = ChangeSet(target_repo, release_branch_name)
+    log.info(f"Last commit on {release_branch_name} is {changes.base_sha}")
 
     log.info(
         f"Updating AndroidComponents.kt from {current_ac_version} to "
         f"{latest_ac_nightly_version} on {pr_branch_name}"
     )
     _update_ac_version(
-        target_repo,
-        pr_branch_name,
-        current_ac_version,
-        latest_ac_nightly_version,
-        author,
-        target_path,
+        changes, current_ac_version, latest_ac_nightly_version, target_path
     )
+    changes.create_branch(pr_branch_name, author)
 
     log.info("Creating pull request")
     pr = target_repo.create_pull(
@@ -568,8 +766,52 @@ def update_android_components_nightly(
         base=release_branch_name,
     )
     log.info(f"Pull request at {pr.html_url}")
+    return pr.html_url
+
 
+# A repository consuming A-C nightlies, the directory holding its buildSrc,
+# and the branch to update
+NightlyTarget = namedtuple("NightlyTarget", ["repo", "path", "branch"])
 
+
+@traced
+def update_android_components_nightly_targets(
+    ac_repo, targets, author, debug, dry_run, max_workers=None
+):
+    """Update every NightlyTarget to the latest A-C nightly. The latest
+    nightly is looked up once; targets are read and updated in parallel.
+    Returns a TaskResult per target, in order, whose result is the URL of
+    the pull request opened, if any, or tasks.DEFERRED if the rate limit
+    budget postponed the target to a later run."""
+    latest_ac_nightly_version = get_latest_ac_nightly_version()
+    log.info(f"Latest A-C nightly is {latest_ac_nightly_version}")
+    return run_tasks(
+        schedule(
+            [
+                ScheduledTask(
+                    f"{target.repo.full_name}:{target.branch}",
+                    functools.partial(
+                        update_android_components_nightly,
+                        ac_repo,
+                        target.repo,
+                        target.path,
+                        author,
+                        debug,
+                        target.branch,
+                        dry_run,
+                        latest_ac_nightly_version,
+                    ),
+                    PRIORITY_MAIN,
+                    task_cost("update-android-components"),
+                )
+                for target in targets
+            ]
+        ),
+        max_workers=max_workers,
+    )
+
+
+@traced
 def update_android_components_release(
     ac_repo,
     target_repo,
@@ -584,7 +826,7 @@ def update_android_components_release(
     log.info(f"Looking at {target_product} {major_version}")
 
     # Make sure the release branch for this version exists
-    release_branch = target_repo.get_branch(target_branch)
+    snapshot.get_head_sha(target_repo, target_branch)
 
     log.info(f"Looking at {target_product} {major_version} on {target_branch}")
 
@@ -617,34 +859,19 @@ def update_android_components_release(
     # Create a non unique PR branch name for work on this release branch.
     pr_branch_name = f"relbot/{target_product}-{major_version}"
 
-    try:
-        pr_branch = target_repo.get_branch(pr_branch_name)
-        if pr_branch:
-            log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
-            return
-    except GithubException:
-        # TODO Only ignore a 404 here, fail on others
-        pass
-
-    log.info(f"Last commit on {target_branch} is {release_branch.commit.sha}")
+    if pr_branch_exists(target_repo, pr_branch_name):
+        log.warning(f"The PR branch {pr_branch_name} already exists. Exiting.")
+        return
 
-    log.info(f"Creating branch {pr_branch_name} on {release_branch.commit.sha}")
-    target_repo.create_git_ref(
-        ref=f"refs/heads/{pr_branch_name}", sha=release_branch.commit.sha
-    )
+    changes = ChangeSet(target_repo, target_branch)
+    log.info(f"Last commit on {target_branch} is {changes.base_sha}")
 
     log.info(
         f"Updating AndroidComponents.kt from {current_ac_version} to "
         f"{latest_ac_version} on {pr_branch_name}"
     )
-    _update_ac_version(
-        target_repo,
-        pr_branch_name,
-        current_ac_version,
-        latest_ac_version,
-        author,
-        target_path,
-    )
+    _update_ac_version(changes, current_ac_version, latest_ac_version, target_path)
+    changes.create_branch(pr_branch_name, author)
 
     log.info("Creating pull request")
     pr = target_repo.create_pull(
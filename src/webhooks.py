@@ -0,0 +1,266 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# relbot webhooks: react to upstream publishes instead of polling.
+#
+# A small HTTP receiver accepts JSON notifications and maps each of them to
+# the few tasks it affects:
+#
+#   POST /maven        {"group": "org.mozilla.geckoview",
+#                       "artifact": "geckoview-beta-omni",
+#                       "version": "126.0.20240415153215"}
+#   POST /taskcluster  {"routes": ["index.project.application-services..."]}
+#   POST /github       a GitHub push event (X-GitHub-Event: push)
+#
+# maven.mozilla.org and nightly.maven.mozilla.org do not send webhooks of
+# their own, so whatever publishes or watches the artifacts has to.
+#
+# Events seen before are ignored, and every task runs once a burst of events
+# asking for it has been quiet for RELBOT_WEBHOOK_DEBOUNCE seconds. When
+# RELBOT_WEBHOOK_SECRET is set, requests must be signed with it like GitHub
+# signs its deliveries (X-Hub-Signature-256). Without it, anyone who can
+# reach the receiver can make relbot open pull requests, so it then only
+# listens on 127.0.0.1.
+#
+
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+DEFAULT_DEBOUNCE = 60
+
+# Events are small. Larger requests are refused without reading them.
+MAX_BODY = 1024 * 1024
+
+# How many event ids are remembered to drop duplicates
+SEEN_EVENTS = 1024
+
+# A task to run on a branch of firefox-android, or on reference-browser
+Action = namedtuple("Action", ["task", "branch"])
+
+UPDATE_REFERENCE_BROWSER = Action("update-android-components", "reference-browser")
+
+
+def _release_branch(version):
+    return f"releases_v{version.split('.', 1)[0]}"
+
+
+def maven_actions(payload):
+    """Return the event id and the actions of a Maven publish event."""
+    group = payload["group"]
+    artifact = payload["artifact"]
+    version = payload["version"]
+    event_id = f"maven:{group}:{artifact}:{version}"
+    if group == "org.mozilla.geckoview":
+        if artifact.startswith("geckoview-nightly"):
+            return event_id, [Action("update-geckoview", "main")]
+        return event_id, [Action("update-geckoview", _release_branch(version))]
+    if group == "org.mozilla.appservices":
+        return event_id, [Action("update-as", "main")]
+    if group == "org.mozilla.components":
+        return event_id, [UPDATE_REFERENCE_BROWSER]
+    return event_id, []
+
+
+def taskcluster_actions(payload):
+    """Return the event id and the actions of a Taskcluster index event."""
+    routes = payload["routes"]
+    event_id = payload.get("taskId") or f"taskcluster:{','.join(sorted(routes))}"
+    actions = []
+    for route in routes:
+        if "project.application-services" in route:
+            actions.append(Action("update-as", "main"))
+    return event_id, actions
+
+
+def github_actions(event, delivery, payload):
+    """Return the event id and the actions of a GitHub webhook delivery."""
+    event_id = f"github:{delivery or payload.get('after')}"
+    if event != "push":
+        return event_id, []
+    branch = payload.get("ref", "").removeprefix("refs/heads/")
+    if re.match(r"^releases[_/]v\d+$", branch):
+        return event_id, [Action("update-geckoview", branch)]
+    return event_id, []
+
+
+class Receiver:
+    """Drops duplicate events and debounces the actions they ask for."""
+
+    def __init__(self, debounce=None, clock=time.monotonic):
+        self.debounce = (
+            debounce
+            if debounce is not None
+            else float(os.getenv("RELBOT_WEBHOOK_DEBOUNCE") or DEFAULT_DEBOUNCE)
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()
+        # {action: time it is due}
+        self.pending = {}
+        self.wakeup = threading.Event()
+
+    def submit(self, event_id, actions):
+        """Schedule actions. Returns False if event_id was seen before."""
+        with self._lock:
+            if event_id in self._seen:
+                self._seen.move_to_end(event_id)
+                return False
+            self._seen[event_id] = True
+            if len(self._seen) > SEEN_EVENTS:
+                self._seen.popitem(last=False)
+            due = self._clock() + self.debounce
+            for action in actions:
+                self.pending[action] = due
+        self.wakeup.set()
+        return True
+
+    def pop_due(self):
+        """Return the actions that are due, and forget them."""
+        now = self._clock()
+        with self._lock:
+            due = [action for action, at in self.pending.items() if at <= now]
+            for action in due:
+                del self.pending[action]
+            return due
+
+    def next_due(self):
+        """Return the seconds until the next action is due, or None."""
+        with self._lock:
+            if not self.pending:
+                return None
+            return max(min(self.pending.values()) - self._clock(), 0)
+
+
+def verify_signature(secret, body, signature):
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            return self._reply(413, {"error": f"Body must be {MAX_BODY} bytes or less"})
+        body = self.rfile.read(length)
+        secret = self.server.secret
+        if secret and not verify_signature(
+            secret, body, self.headers.get("X-Hub-Signature-256")
+        ):
+            return self._reply(401, {"error": "Bad signature"})
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError("Expected a JSON object")
+            if self.path == "/maven":
+                event_id, actions = maven_actions(payload)
+            elif self.path == "/taskcluster":
+                event_id, actions = taskcluster_actions(payload)
+            elif self.path == "/github":
+                event_id, actions = github_actions(
+                    self.headers.get("X-GitHub-Event"),
+                    self.headers.get("X-GitHub-Delivery"),
+                    payload,
+                )
+            else:
+                return self._reply(404, {"error": "Unknown event source"})
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            return self._reply(400, {"error": f"Invalid event: {e}"})
+        if not self.server.receiver.submit(event_id, actions):
+            return self._reply(200, {"duplicate": True})
+        log.info(f"Event {event_id} schedules {actions}")
+        self._reply(202, {"actions": [list(action) for action in actions]})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+def create_server(receiver, port=None, secret=None):
+    """Return an HTTP server feeding events to receiver. Port 0 picks any
+    free port. Without a secret, it only listens on 127.0.0.1."""
+    if port is None:
+        port = int(os.getenv("RELBOT_WEBHOOK_PORT") or DEFAULT_PORT)
+    if secret is None:
+        secret = os.getenv("RELBOT_WEBHOOK_SECRET")
+    if not secret:
+        log.warning("No RELBOT_WEBHOOK_SECRET set, only listening on 127.0.0.1")
+    server = ThreadingHTTPServer(("" if secret else "127.0.0.1", port), WebhookHandler)
+    server.daemon_threads = True
+    server.receiver = receiver
+    server.secret = secret
+    return server
+
+
+def run_action(action, firefox_repo, rb_repo, author, debug, dry_run):
+    """Run the task an Action stands for."""
+    import state
+
+    with state.recording(f"webhooks {action.task} {action.branch}"):
+        if action == UPDATE_REFERENCE_BROWSER:
+            import reference_browser
+
+            reference_browser.update_android_components_in_rb(
+                firefox_repo, rb_repo, author, debug
+            )
+        else:
+            import android_components
+
+            android_components.update_branch(
+                firefox_repo, action.branch, action.task, author, dry_run
+            )
+
+
+def serve(run, stop, receiver=None, server=None):
+    """Receive events and run(action) for every action once it is due, one
+    at a time, until the threading.Event stop is set."""
+    import daemon
+
+    receiver = receiver or Receiver()
+    server = server or create_server(receiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    log.info(f"Receiving webhooks on port {server.server_port}")
+    try:
+        with daemon.serving_http_cache():
+            while not stop.is_set():
+                for action in receiver.pop_due():
+                    daemon.run_isolated(
+                        f"{action.task}/{action.branch}", lambda: run(action)
+                    )
+                receiver.wakeup.clear()
+                delay = receiver.next_due()
+                # Wake up when the next action is due, on a new event, or to
+                # check stop at least every second
+                receiver.wakeup.wait(1 if delay is None else min(delay, 1))
+    finally:
+        server.shutdown()
+        server.server_close()
+    log.info("Stopped receiving webhooks")
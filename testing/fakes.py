@@ -0,0 +1,71 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Small fakes shared by the unit tests. For whole runs against GitHub and
+# Maven, see standins.py.
+#
+
+
+from types import SimpleNamespace
+
+
+class FakeClock:
+    """A clock that only moves when told to, or when slept on."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRepo:
+    """mozilla-mobile/firefox-android with files on main. Records the calls
+    made to it, in order."""
+
+    full_name = "mozilla-mobile/firefox-android"
+
+    def __init__(self, files):
+        self.heads = {"main": "a" * 40}
+        self.files = {("a" * 40, path): content for path, content in files.items()}
+        self.calls = []
+
+    def get_git_ref(self, ref):
+        self.calls.append(("get_git_ref", ref))
+        return SimpleNamespace(object=SimpleNamespace(sha=self.heads[ref[6:]]))
+
+    def get_git_matching_refs(self, ref):
+        self.calls.append(("get_git_matching_refs", ref))
+        return [
+            SimpleNamespace(ref=f"refs/heads/{name}", object=SimpleNamespace(sha=sha))
+            for name, sha in sorted(self.heads.items())
+            if f"heads/{name}".startswith(ref)
+        ]
+
+    def get_contents(self, path, ref):
+        self.calls.append(("get_contents", path, ref))
+        return SimpleNamespace(
+            path=path,
+            sha=f"blob-{ref}",
+            decoded_content=self.files[(ref, path)].encode("utf8"),
+        )
+
+    def get_git_commit(self, sha):
+        self.calls.append(("get_git_commit", sha))
+        return SimpleNamespace(sha=sha, tree="base-tree")
+
+    def create_git_tree(self, tree, base_tree):
+        self.calls.append(("create_git_tree", [e._identity for e in tree], base_tree))
+        return "new-tree"
+
+    def create_git_commit(self, message, tree, parents, author):
+        self.calls.append(("create_git_commit", message, tree))
+        return SimpleNamespace(sha="b" * 40)
+
+    def create_git_ref(self, ref, sha):
+        self.calls.append(("create_git_ref", ref, sha))
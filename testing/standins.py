@@ -0,0 +1,646 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/
+
+#
+# Local stand-ins for the services relbot talks to, for benchmarks and tests.
+#
+# GitHubStandIn speaks the subset of the GitHub REST API relbot uses
+# (contents, branches, refs, Git Data, pulls, issue comments, releases) plus
+# the branch state GraphQL query, over repositories kept in memory.
+# MavenStandIn serves Maven metadata, .module and .pom files and Taskcluster
+# index artifacts from a dict of paths, and answers conditional requests.
+# Both count the requests they answer per endpoint, the bytes they send and
+# the connections they answer on, and can add latency to every answer.
+#
+# scenario() fills both with firefox-android and reference-browser
+# repositories and the upstream releases they can be updated to.
+#
+
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import util
+
+RATE_LIMIT = 5000
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        endpoint, status, payload, headers = self.server.respond(
+            method, unquote(url.path), parse_qs(url.query), body, self.headers
+        )
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode("utf8")
+            headers = {"Content-Type": "application/json", **headers}
+        self.server.record(method, endpoint, len(payload), self.client_address)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A local HTTP server answering from memory, in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.bytes = 0
+        self.clients = set()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record(self, method, endpoint, size, client):
+        with self.lock:
+            self.calls[f"{method} {endpoint}"] += 1
+            self.bytes += size
+            self.clients.add(client)
+
+    def reset_counts(self):
+        with self.lock:
+            self.calls.clear()
+            self.bytes = 0
+            self.clients.clear()
+
+    def respond(self, method, path, query, body, headers):
+        """Return (endpoint, status, payload, headers) for a request with
+        headers."""
+        raise NotImplementedError
+
+
+def _sha(*parts):
+    return hashlib.sha1("\0".join(parts).encode("utf8")).hexdigest()
+
+
+class FakeRepository:
+    """A GitHub repository: branches pointing at commits, which hold the full
+    contents of the files, plus the pulls, comments and releases created."""
+
+    def __init__(self, full_name):
+        self.full_name = full_name
+        self.branches = {}
+        self.commits = {}
+        self.trees = {}
+        self.pulls = []
+        self.comments = []
+        self.releases = []
+
+    def commit(self, branch, files, message="Initial commit"):
+        """Point branch at a new commit with files, relative to the branch
+        head if it exists."""
+        parent = self.branches.get(branch)
+        contents = dict(self.commits[parent]["files"]) if parent else {}
+        contents.update(files)
+        tree = _sha("tree", *sorted(f"{p}={c}" for p, c in contents.items()))
+        self.trees[tree] = contents
+        sha = _sha("commit", tree, parent or "", message)
+        self.commits[sha] = {
+            "files": contents,
+            "tree": tree,
+            "parents": [parent] if parent else [],
+            "message": message,
+        }
+        self.branches[branch] = sha
+        return sha
+
+
+class GitHubStandIn(StandInServer):
+    # GraphQL truncates the text of larger blobs
+    GRAPHQL_MAX_TEXT = 512 * 1024
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.repos = {}
+        self.remaining = RATE_LIMIT
+
+    def add_repo(self, full_name):
+        repo = self.repos[full_name] = FakeRepository(full_name)
+        return repo
+
+    def respond(self, method, path, query, body, request_headers):
+        with self.lock:
+            self.remaining = max(self.remaining - 1, 0)
+            headers = {
+                "X-RateLimit-Limit": str(RATE_LIMIT),
+                "X-RateLimit-Remaining": str(self.remaining),
+                "X-RateLimit-Reset": str(int(time.time()) + 3600),
+                "X-RateLimit-Used": str(RATE_LIMIT - self.remaining),
+            }
+            if path == "/graphql":
+                return ("graphql", 200, self._graphql(body["query"]), headers)
+            match = re.match(r"^/repos/([^/]+/[^/]+)(/.*)?$", path)
+            if not match or match[1] not in self.repos:
+                return ("other", 404, {"message": "Not Found"}, headers)
+            repo = self.repos[match[1]]
+            endpoint, status, payload = self._rest(
+                repo, method, match[2] or "", query, body
+            )
+            return (endpoint, status, payload, headers)
+
+    def _url(self, repo, path=""):
+        return f"{self.url}/repos/{repo.full_name}{path}"
+
+    def _ref(self, repo, branch):
+        return {
+            "ref": f"refs/heads/{branch}",
+            "url": self._url(repo, f"/git/refs/heads/{branch}"),
+            "object": {"sha": repo.branches[branch], "type": "commit"},
+        }
+
+    def _commit(self, repo, sha):
+        commit = repo.commits[sha]
+        return {
+            "sha": sha,
+            "url": self._url(repo, f"/git/commits/{sha}"),
+            "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": self._url(repo, "/git/trees")},
+            "parents": [{"sha": parent} for parent in commit["parents"]],
+        }
+
+    def _rest(self, repo, method, path, query, body):
+        not_found = {"message": "Not Found"}
+        if method == "GET" and path == "":
+            return (
+                "repos",
+                200,
+                {"full_name": repo.full_name, "url": self._url(repo)},
+            )
+
+        if method == "GET" and path.startswith("/contents/"):
+            file_path = path[len("/contents/") :]
+            ref = query.get("ref", ["main"])[0]
+            sha = repo.branches.get(ref, ref)
+            content = repo.commits.get(sha, {"files": {}})["files"].get(file_path)
+            if content is None:
+                return ("contents", 404, not_found)
+            return (
+                "contents",
+                200,
+                {
+                    "type": "file",
+                    "encoding": "base64",
+                    "path": file_path,
+                    "name": file_path.rsplit("/", 1)[-1],
+                    "sha": _sha("blob", content),
+                    "content": base64.b64encode(content.encode("utf8")).decode(),
+                    "url": self._url(repo, path),
+                },
+            )
+
+        if method == "GET" and path.startswith("/branches/"):
+            branch = path[len("/branches/") :]
+            if branch not in repo.branches:
+                return ("branches", 404, not_found)
+            return (
+                "branches",
+                200,
+                {
+                    "name": branch,
+                    "commit": {
+                        "sha": repo.branches[branch],
+                        "url": self._url(repo, f"/commits/{repo.branches[branch]}"),
+                    },
+                },
+            )
+
+        if method == "GET" and path.startswith("/git/refs/heads/"):
+            branch = path[len("/git/refs/heads/") :]
+            if branch not in repo.branches:
+                return ("git/refs", 404, not_found)
+            return ("git/refs", 200, self._ref(repo, branch))
+
+        if method == "GET" and path.startswith("/git/matching-refs/heads/"):
+            prefix = path[len("/git/matching-refs/heads/") :]
+            return (
+                "git/matching-refs",
+                200,
+                [
+                    self._ref(repo, branch)
+                    for branch in sorted(repo.branches)
+                    if branch.startswith(prefix)
+                ],
+            )
+
+        if method == "GET" and path.startswith("/git/commits/"):
+            sha = path[len("/git/commits/") :]
+            if sha not in repo.commits:
+                return ("git/commits", 404, not_found)
+            return ("git/commits", 200, self._commit(repo, sha))
+
+        if method == "POST" and path == "/git/trees":
+            contents = dict(repo.trees[body["base_tree"]])
+            for element in body["tree"]:
+                contents[element["path"]] = element["content"]
+            tree = _sha("tree", *sorted(f"{p}={c}" for p, c in contents.items()))
+            repo.trees[tree] = contents
+            return (
+                "git/trees",
+                201,
+                {"sha": tree, "url": self._url(repo, f"/git/trees/{tree}"), "tree": []},
+            )
+
+        if method == "POST" and path == "/git/commits":
+            sha = _sha("commit", body["tree"], *body["parents"], body["message"])
+            repo.commits[sha] = {
+                "files": repo.trees[body["tree"]],
+                "tree": body["tree"],
+                "parents": body["parents"],
+                "message": body["message"],
+            }
+            return ("git/commits", 201, self._commit(repo, sha))
+
+        if method == "POST" and path == "/git/refs":
+            branch = body["ref"][len("refs/heads/") :]
+            if branch in repo.branches:
+                return ("git/refs", 422, {"message": "Reference already exists"})
+            repo.branches[branch] = body["sha"]
+            return ("git/refs", 201, self._ref(repo, branch))
+
+        if method == "POST" and path == "/pulls":
+            number = len(repo.pulls) + 1
+            repo.pulls.append(body)
+            return (
+                "pulls",
+                201,
+                {
+                    "number": number,
+                    "url": self._url(repo, f"/pulls/{number}"),
+                    "html_url": f"https://github.com/{repo.full_name}/pull/{number}",
+                    "title": body["title"],
+                },
+            )
+
+        if match := re.match(r"^/issues/(\d+)(/comments)?$", path):
+            number = int(match[1])
+            if number > len(repo.pulls):
+                return ("issues", 404, not_found)
+            if method == "POST" and match[2]:
+                repo.comments.append((number, body["body"]))
+                return ("issues/comments", 201, {"id": len(repo.comments), **body})
+            return (
+                "issues",
+                200,
+                {
+                    "number": number,
+                    "url": self._url(repo, f"/issues/{number}"),
+                    "title": repo.pulls[number - 1]["title"],
+                },
+            )
+
+        if method == "GET" and path == "/releases":
+            return (
+                "releases",
+                200,
+                [
+                    {"id": i, "tag_name": tag, "url": self._url(repo, f"/releases/{i}")}
+                    for i, tag in enumerate(repo.releases, start=1)
+                ],
+            )
+
+        return ("other", 404, not_found)
+
+    def _graphql(self, query):
+        """Answer the branch state queries built by github_graphql."""
+        owner, name = re.search(
+            r'repository\(owner: ("[^"]*"), name: ("[^"]*")\)', query
+        ).groups()
+        repo = self.repos.get(f"{json.loads(owner)}/{json.loads(name)}")
+        if repo is None:
+            return {"data": {"repository": None}}
+        paths = re.findall(r'(f\d+): file\(path: ("[^"]*")\)', query)
+        repository = {}
+        for alias, ref in re.findall(r'(b\d+): ref\(qualifiedName: ("[^"]*")\)', query):
+            branch = json.loads(ref)[len("refs/heads/") :]
+            if branch not in repo.branches:
+                repository[alias] = None
+                continue
+            sha = repo.branches[branch]
+            target = {"oid": sha}
+            files = repo.commits[sha]["files"]
+            for file_alias, path in paths:
+                text = files.get(json.loads(path))
+                target[file_alias] = (
+                    None
+                    if text is None
+                    else {
+                        "object": {
+                            "oid": _sha("blob", text),
+                            "text": text[: self.GRAPHQL_MAX_TEXT],
+                            "isBinary": False,
+                            "isTruncated": len(text) > self.GRAPHQL_MAX_TEXT,
+                        }
+                    }
+                )
+            repository[alias] = {"target": target}
+        return {"data": {"repository": repository}}
+
+
+class MavenStandIn(StandInServer):
+    """Serves files, a dict of path to str, for Maven and the Taskcluster
+    index alike. Every file has an ETag derived from its content, and a
+    Last-Modified date if one is set in last_modified. Conditional requests
+    for a file that did not change are answered with 304."""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.files = {}
+        self.last_modified = {}
+        self.not_modified = 0
+
+    def respond(self, method, path, query, body, request_headers):
+        if "/api/index/" in path:
+            endpoint = "taskcluster"
+        elif path.endswith("/maven-metadata.xml"):
+            endpoint = "maven-metadata.xml"
+        else:
+            endpoint = path.rsplit(".", 1)[-1]
+        content = self.files.get(path)
+        if content is None:
+            return (endpoint, 404, b"", {})
+        headers = {"ETag": f'"{_sha(content)[:16]}"'}
+        if last_modified := self.last_modified.get(path):
+            headers["Last-Modified"] = last_modified
+        if etag := request_headers.get("If-None-Match"):
+            unchanged = etag == headers["ETag"]
+        else:
+            since = request_headers.get("If-Modified-Since")
+            unchanged = since is not None and since == last_modified
+        if unchanged:
+            with self.lock:
+                self.not_modified += 1
+            return (endpoint, 304, b"", headers)
+        return (endpoint, 200, content.encode("utf8"), headers)
+
+
+#
+# A scenario: the repositories relbot works on and what upstream published
+#
+
+GECKO_KT = """object Gecko {{
+    const val version = "{version}"
+    val channel = GeckoChannel.{channel}
+}}
+"""
+
+DEPENDENCIES_PLUGIN_KT = """object Versions {{
+    const val mozilla_glean = "{glean}"
+}}
+"""
+
+APPLICATION_SERVICES_KT = """object ApplicationServicesConfig {{
+    val VERSION = "{version}"
+    val CHANNEL = ApplicationServicesChannel.{channel}
+}}
+"""
+
+ANDROID_COMPONENTS_KT = """object AndroidComponents {{
+    const val VERSION = "{version}"
+}}
+"""
+
+METADATA = """<?xml version="1.0" encoding="UTF-8"?>
+<metadata>
+  <versioning>
+    <latest>{latest}</latest>
+    <versions>
+{versions}
+    </versions>
+  </versioning>
+</metadata>
+"""
+
+
+def maven_metadata(versions):
+    return METADATA.format(
+        latest=versions[-1],
+        versions="\n".join(f"      <version>{v}</version>" for v in versions),
+    )
+
+
+def glean_module(glean_version):
+    return json.dumps(
+        {
+            "variants": [
+                {
+                    "capabilities": [
+                        {
+                            "group": "org.mozilla.telemetry",
+                            "name": "glean-native",
+                            "version": glean_version,
+                        }
+                    ]
+                }
+            ]
+        }
+    )
+
+
+def publish_gv(maven, channel, versions, glean_version):
+    """Publish GeckoView versions of channel, in ascending order, for all
+    architectures and both omni and lite builds."""
+    lite = "geckoview" if channel == "release" else f"geckoview-{channel}"
+    omni = f"{lite}-omni"
+    for name in (lite, omni):
+        maven.files[f"/maven2/org/mozilla/geckoview/{name}/maven-metadata.xml"] = (
+            maven_metadata(versions)
+        )
+    for version in versions:
+        maven.files[
+            f"/maven2/org/mozilla/geckoview/{omni}/{version}/{omni}-{version}.module"
+        ] = glean_module(glean_version)
+        publish_gv_poms(maven, version, name=omni)
+
+
+def publish_gv_poms(maven, version, name="geckoview-omni"):
+    """Publish the per-architecture POMs of a single GeckoView build."""
+    for arch in util.GV_ARCHITECTURES:
+        maven.files[
+            f"/maven2/org/mozilla/geckoview/{name}-{arch}/{version}/"
+            f"{name}-{arch}-{version}.pom"
+        ] = "<project/>"
+
+
+def scenario(github, maven, release_branches=(125, 126), outdated=True):
+    """Fill the stand-ins with firefox-android and reference-browser
+    repositories, and with upstream releases. With outdated set, every
+    branch is one release behind upstream and gets a PR; otherwise every
+    branch is up to date and runs are no-ops."""
+    behind = 1 if outdated else 0
+    newest = max(release_branches) + 1
+    nightly = [f"{newest}.0.2024040{day}094500" for day in range(1, 4)]
+    as_nightly = [f"{newest}.2024040{day}050000" for day in range(1, 4)]
+    ac_nightly = [f"{newest}.0.2024040{day}090000" for day in range(1, 4)]
+
+    firefox = github.add_repo("mozilla-mobile/firefox-android")
+    firefox.commit(
+        "main",
+        {
+            "version.txt": f"{newest}.0a1\n",
+            "android-components/plugins/dependencies/src/main/java/Gecko.kt": (
+                GECKO_KT.format(version=nightly[-1 - behind], channel="NIGHTLY")
+            ),
+            "android-components/plugins/dependencies/src/main/java/"
+            "DependenciesPlugin.kt": DEPENDENCIES_PLUGIN_KT.format(glean="60.0.0"),
+            "android-components/plugins/dependencies/src/main/java/"
+            "ApplicationServices.kt": APPLICATION_SERVICES_KT.format(
+                version=as_nightly[-1 - behind], channel="NIGHTLY"
+            ),
+        },
+    )
+    publish_gv(maven, "nightly", nightly, "60.0.0")
+    maven.files[
+        "/api/index/v1/task/project.application-services.v2.nightly.latest/"
+        "artifacts/public/build/nightly.json"
+    ] = json.dumps({"version": as_nightly[-1]})
+
+    published = {"release": [], "beta": []}
+    for major in sorted(release_branches):
+        channel = "beta" if major == max(release_branches) else "release"
+        releases = [f"{major}.0.2024030{patch}185343" for patch in range(1, 4)]
+        published[channel].extend(releases)
+        firefox.commit(
+            f"releases_v{major}",
+            {
+                "version.txt": f"{major}.0\n",
+                "android-components/plugins/dependencies/src/main/java/Gecko.kt": (
+                    GECKO_KT.format(
+                        version=releases[-1 - behind], channel=channel.upper()
+                    )
+                ),
+                "android-components/plugins/dependencies/src/main/java/"
+                "DependenciesPlugin.kt": DEPENDENCIES_PLUGIN_KT.format(glean="60.0.0"),
+            },
+        )
+        firefox.releases.append(f"components-v{major}.0")
+    for channel, versions in published.items():
+        if versions:
+            publish_gv(maven, channel, versions, "60.0.0")
+
+    reference_browser = github.add_repo("mozilla-mobile/reference-browser")
+    reference_browser.commit(
+        "master",
+        {
+            "buildSrc/src/main/java/AndroidComponents.kt": (
+                ANDROID_COMPONENTS_KT.format(version=ac_nightly[-1 - behind])
+            )
+        },
+    )
+    maven.files["/nightly/org/mozilla/components/ui-widgets/maven-metadata.xml"] = (
+        maven_metadata(ac_nightly)
+    )
+    return firefox, reference_browser
+
+
+class Environment:
+    """relbot pointed at running stand-ins, see running()."""
+
+    def __init__(self, github, maven, client, author):
+        self.github = github
+        self.maven = maven
+        self.client = client
+        self.firefox_repo = self.repo("mozilla-mobile/firefox-android")
+        self.rb_repo = self.repo("mozilla-mobile/reference-browser")
+        self.author = author
+
+    def repo(self, full_name):
+        """Return a relbot handle on a repository of the GitHub stand-in."""
+        from relbot import LazyRepo
+
+        return LazyRepo(self.client, full_name)
+
+    def reset_counts(self):
+        self.github.reset_counts()
+        self.maven.reset_counts()
+
+
+@contextmanager
+def running(latency=0.0, outdated=True, release_branches=(125, 126)):
+    """Start both stand-ins with a scenario and point relbot at them for the
+    duration of the block. Yields an Environment."""
+    from github import Github, InputGitAuthor
+
+    import daemon
+    import http_session
+
+    with GitHubStandIn(latency) as github, MavenStandIn(latency) as maven:
+        scenario(github, maven, release_branches, outdated)
+        previous_urls = (util.MAVEN, util.MAVEN_NIGHTLY, util.TASKCLUSTER_ROOT_URL)
+        previous_graphql_url = os.environ.get("RELBOT_GITHUB_GRAPHQL_URL")
+        previous_session = http_session.set_session(http_session.create_session())
+        previous_cache = http_session.get_cache()
+        util.MAVEN = f"{maven.url}/maven2"
+        util.MAVEN_NIGHTLY = f"{maven.url}/nightly"
+        util.TASKCLUSTER_ROOT_URL = maven.url
+        os.environ["RELBOT_GITHUB_GRAPHQL_URL"] = f"{github.url}/graphql"
+        http_session.set_cache(None)
+        http_session.install_github_connection()
+        daemon.clear_run_caches()
+        client = Github("token", base_url=github.url)
+        try:
+            yield Environment(
+                github,
+                maven,
+                client,
+                InputGitAuthor("MickeyMoz", "sebastian@mozilla.com"),
+            )
+        finally:
+            daemon.clear_run_caches()
+            http_session.close_session()
+            http_session.set_session(previous_session)
+            http_session.set_cache(previous_cache)
+            util.MAVEN, util.MAVEN_NIGHTLY, util.TASKCLUSTER_ROOT_URL = previous_urls
+            if previous_graphql_url is None:
+                del os.environ["RELBOT_GITHUB_GRAPHQL_URL"]
+            else:
+                os.environ["RELBOT_GITHUB_GRAPHQL_URL"] = previous_graphql_url